@@ -1,20 +1,70 @@
 from dataclasses import dataclass, field
-from typing import Any, Callable, cast, Dict, IO, Iterator, List, Optional, Tuple
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    IO,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import argparse
+import array
+import collections
+import concurrent.futures
+import contextlib
 import csv
+import dataclasses
 import datetime
 import functools
+import glob
+import hashlib
+import http.server
+import io
+import itertools
 import json
 import operator
+import os
+import platform
 import random
+import socket
+import socketserver
+import stat
+import statistics
+import subprocess
 import sys
-
-import pandas as pd
-import plotnine as plt9
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+
+# numpy, pandas, plotnine, and scipy take a while to import, so they are only imported
+# inside of the functions that use them. That way commands that do not need them, like --help and
+# generate_logs, start quickly.
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    import pandas as pd
+    import plotnine as plt9
 
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
+RARITIES = ["Common", "Uncommon", "Rare", "Very rare", "Legendary", "Ultra beast"]
+
+# The rarities as they are named in the columns and keys of output files
+RARITY_KEYS = ["common", "uncommon", "rare", "very_rare", "legendary", "ultra_beast"]
+
+TIME_BUCKETS = ["day", "week", "month"]
+
 
 def main(argv: List[str]) -> None:
     parser = argparse.ArgumentParser()
@@ -29,7 +79,7 @@ def main(argv: List[str]) -> None:
 
     parser_estimate_stats = subparsers.add_parser("estimate_stats", help="")
     parser_estimate_stats.add_argument(
-        "logs_json", nargs="+", help="The JSON Discord log files to process."
+        "logs_json", nargs="*", help="The JSON Discord log files to process."
     )
     parser_estimate_stats.add_argument(
         "--mudae_bot_username",
@@ -58,6 +108,68 @@ def main(argv: List[str]) -> None:
         type=datetime_obj,
         help="if set, filters the roll results to those before this datetime (ex. 2020-10-01T08:30:00)",
     )
+    parser_estimate_stats.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to parse the log files with",
+    )
+    parser_estimate_stats.add_argument(
+        "--cache_dir",
+        default=None,
+        help="if set, caches the parsed results of each log file in this directory so that unchanged files do not need to be parsed again",
+    )
+    parser_estimate_stats.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="confidence level of the intervals reported for the estimated probabilities",
+    )
+    parser_estimate_stats.add_argument(
+        "--bootstrap_samples",
+        type=int,
+        default=1000,
+        help="number of times to resample the days of rolls when bootstrapping the confidence intervals, or 0 to only report the exact binomial intervals",
+    )
+    parser_estimate_stats.add_argument("--rng_seed", type=int, default=42)
+    parser_estimate_stats.add_argument(
+        "--watch",
+        default=None,
+        metavar="DIR",
+        help="if set, keeps running and updates the estimated probabilities whenever JSON log files in this directory are added, grow, or are removed, instead of processing logs_json once",
+    )
+    parser_estimate_stats.add_argument(
+        "--state_file",
+        default="estimate_stats_state.json",
+        help="filepath to keep the running totals of each log file in when using --watch, so that restarting does not need to parse every file again",
+    )
+    parser_estimate_stats.add_argument(
+        "--poll_interval",
+        type=float,
+        default=60.0,
+        help="number of seconds to wait between checking the --watch directory for changes",
+    )
+    parser_estimate_stats.add_argument(
+        "--bucket",
+        choices=TIME_BUCKETS,
+        default=None,
+        help="if set, also estimates the rates for each day, week (starting on Monday), or month, to see how they change over time",
+    )
+    parser_estimate_stats.add_argument(
+        "--output_buckets_csv",
+        default="bucketed_stats.csv",
+        help="filepath to write the rates for each bucket to, when --bucket is set",
+    )
+    parser_estimate_stats.add_argument(
+        "--output_buckets_json",
+        default=None,
+        help="if set along with --bucket, also writes the rates for each bucket as JSON to the given filepath",
+    )
+    parser_estimate_stats.add_argument(
+        "--output_buckets_plot",
+        default=None,
+        help="if set along with --bucket, plots the win rates of each rarity over time to the given filepath",
+    )
 
     parser_simulate = subparsers.add_parser("simulate", help="")
     parser_simulate.add_argument(
@@ -80,16 +192,345 @@ def main(argv: List[str]) -> None:
     parser_simulate.add_argument(
         "--chance_any_new_pokemon_plot", default="chance_any_new_pokemon.png"
     )
+    parser_simulate.add_argument(
+        "--plots",
+        nargs="*",
+        choices=PLOT_NAMES,
+        default=PLOT_NAMES,
+        help="which plots to output, all of them by default. Pass --plots without any plot names to not output any plots.",
+    )
+    parser_simulate.add_argument(
+        "--plot_format",
+        choices=["png", "jpg", "pdf", "svg"],
+        default=None,
+        help="if set, outputs the plots in this format instead of the one given by their filepath's extension",
+    )
+    parser_simulate.add_argument("--plot_dpi", type=int, default=300)
+    parser_simulate.add_argument(
+        "--plot_workers",
+        type=int,
+        default=len(PLOT_NAMES),
+        help="number of processes to render the plots with",
+    )
     parser_simulate.add_argument("--autorelease", action="store_true", default=False)
+    parser_simulate.add_argument(
+        "--engine",
+        choices=["python", "numpy"],
+        default="python",
+        help="simulation engine to use, numpy runs all of the cases at once in bulk",
+    )
+    parser_simulate.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to split the cases across, the results for a given --rng_seed are the same for any number of workers",
+    )
+    parser_simulate.add_argument(
+        "--summary_only",
+        action="store_true",
+        default=False,
+        help="only keep running summary statistics across the cases rather than every case's results, and plot percentile bands",
+    )
+    parser_simulate.add_argument(
+        "--target_ci",
+        type=float,
+        default=None,
+        metavar="WIDTH",
+        help="if set, keeps simulating cases until the widest confidence interval of the mean number of unique pokemon after each roll is at most WIDTH, instead of simulating --num_cases cases. Implies --summary_only",
+    )
+    parser_simulate.add_argument(
+        "--max_cases",
+        type=int,
+        default=100000,
+        help="most cases to simulate with --target_ci before giving up on reaching it",
+    )
+    parser_simulate.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="confidence level of the intervals used by --target_ci",
+    )
+    parser_simulate.add_argument(
+        "--exact",
+        action="store_true",
+        default=False,
+        help="calculate the expected collection progress exactly instead of simulating cases (does not support --autorelease)",
+    )
+    parser_simulate.add_argument(
+        "--exact_distribution_csv",
+        default=None,
+        help="if set with --exact, outputs a csv of the percentiles of the number of unique pokemon after each roll to the given filepath",
+    )
+
+    parser_compare = subparsers.add_parser(
+        "compare",
+        help="simulates two slot machine configurations with the same random numbers and reports how much faster one collects pokemon than the other",
+    )
+    parser_compare.add_argument(
+        "pokemon_csv", help="filepath to csv listing pokemon and their rarity"
+    )
+    parser_compare.add_argument("probabilities_json_a")
+    parser_compare.add_argument(
+        "probabilities_json_b",
+        help="probabilities to compare against probabilities_json_a, which can be the same file to only compare --autorelease_a and --autorelease_b",
+    )
+    parser_compare.add_argument("--autorelease_a", action="store_true", default=False)
+    parser_compare.add_argument("--autorelease_b", action="store_true", default=False)
+    parser_compare.add_argument("--rng_seed", type=int, default=42)
+    parser_compare.add_argument("--num_rolls", type=int, default=10)
+    parser_compare.add_argument("--num_cases", type=int, default=1000)
+    parser_compare.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to split the cases across, the results for a given --rng_seed are the same for any number of workers",
+    )
+    parser_compare.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="confidence level of the bands around the difference",
+    )
+    parser_compare.add_argument("--output_csv", default="comparison.csv")
+    parser_compare.add_argument(
+        "--output_plot",
+        default="comparison.png",
+        help="filepath to plot the difference to, or an empty string to not plot it",
+    )
+
+    parser_sweep = subparsers.add_parser(
+        "sweep",
+        help="simulates every point of a grid of scaled probabilities, autorelease settings, and roll budgets, and outputs a table of the results",
+    )
+    parser_sweep.add_argument(
+        "pokemon_csv", help="filepath to csv listing pokemon and their rarity"
+    )
+    parser_sweep.add_argument("probabilities_json")
+    parser_sweep.add_argument(
+        "grid_json",
+        help="filepath to a JSON grid spec with the probability scales, autorelease settings, and numbers of rolls to simulate",
+    )
+    parser_sweep.add_argument("--rng_seed", type=int, default=42)
+    parser_sweep.add_argument("--num_cases", type=int, default=1000)
+    parser_sweep.add_argument(
+        "--engine",
+        choices=["python", "numpy"],
+        default="numpy",
+        help="simulation engine to use, numpy runs all of the cases at once in bulk",
+    )
+    parser_sweep.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to simulate the grid points with, the results for a given --rng_seed are the same for any number of workers",
+    )
+    parser_sweep.add_argument(
+        "--cache_dir",
+        default="sweep_cache",
+        help="directory to cache the summary of each grid point in, so that points that have already been simulated are not simulated again",
+    )
+    parser_sweep.add_argument("--output_csv", default="sweep.csv")
+
+    parser_benchmark = subparsers.add_parser(
+        "benchmark",
+        help="times the simulation and log processing hot paths and writes the timings and peak memory use to a JSON file",
+    )
+    parser_benchmark.add_argument(
+        "pokemon_csv", help="filepath to csv listing pokemon and their rarity"
+    )
+    parser_benchmark.add_argument("probabilities_json")
+    parser_benchmark.add_argument(
+        "--output_json",
+        default="benchmark_results.json",
+        help="filepath to write the benchmark results to",
+    )
+    parser_benchmark.add_argument("--rng_seed", type=int, default=42)
+    parser_benchmark.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="number of times to time each benchmark",
+    )
+    parser_benchmark.add_argument(
+        "--num_ops",
+        type=int,
+        default=10000,
+        help="number of calls to make in each run of the function level benchmarks",
+    )
+    parser_benchmark.add_argument(
+        "--simulate_scales",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="numbers of cases of 100 rolls to benchmark simulate and the SimulationData data frame conversions with",
+    )
+    parser_benchmark.add_argument(
+        "--estimate_stats_scales",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="numbers of log messages to benchmark estimate_stats with",
+    )
+    parser_benchmark.add_argument(
+        "--filter",
+        default=None,
+        help="if set, only runs the benchmarks whose name contains this",
+    )
+
+    parser_serve = subparsers.add_parser(
+        "serve",
+        help="keeps the pokemon and probabilities loaded and answers collection progress and completion queries over HTTP, caching the answers",
+    )
+    parser_serve.add_argument(
+        "pokemon_csv", help="filepath to csv listing pokemon and their rarity"
+    )
+    parser_serve.add_argument("probabilities_json")
+    parser_serve.add_argument("--host", default="127.0.0.1")
+    parser_serve.add_argument("--port", type=int, default=8000)
+    parser_serve.add_argument(
+        "--unix_socket",
+        default=None,
+        help="if set, serves on a Unix socket at this filepath instead of on --host and --port",
+    )
+    parser_serve.add_argument(
+        "--num_cases",
+        type=int,
+        default=1000,
+        help="number of cases to simulate for each query",
+    )
+    parser_serve.add_argument(
+        "--engine",
+        choices=["python", "numpy"],
+        default="numpy",
+        help="simulation engine to use",
+    )
+    parser_serve.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to split each query's cases across",
+    )
+    parser_serve.add_argument(
+        "--cache_size",
+        type=int,
+        default=1024,
+        help="number of query answers to keep, the least recently used are dropped first",
+    )
+    parser_serve.add_argument(
+        "--roll_limit",
+        type=int,
+        default=10000,
+        help="largest num_rolls or max_rolls that a query can ask for, since the memory used to answer a query grows with its number of rolls",
+    )
+
+    parser_generate_logs = subparsers.add_parser(
+        "generate_logs",
+        help="generates synthetic Discord logs of pokeslot results rolled from the given probabilities, for testing estimate_stats",
+    )
+    parser_generate_logs.add_argument(
+        "pokemon_csv", help="filepath to csv listing pokemon and their rarity"
+    )
+    parser_generate_logs.add_argument("probabilities_json")
+    parser_generate_logs.add_argument(
+        "--output_dir",
+        default="generated_logs",
+        help="directory to write the generated JSON Discord log files to",
+    )
+    parser_generate_logs.add_argument(
+        "--num_messages",
+        type=int,
+        default=10000,
+        help="total number of messages to generate across all of the files",
+    )
+    parser_generate_logs.add_argument(
+        "--num_files",
+        type=int,
+        default=1,
+        help="number of log files to split the messages across",
+    )
+    parser_generate_logs.add_argument("--rng_seed", type=int, default=42)
+    parser_generate_logs.add_argument(
+        "--start_datetime",
+        default=datetime.datetime(2020, 8, 11),
+        type=datetime_obj,
+        help="datetime the generated messages start after (ex. 2020-10-01T00:00:00)",
+    )
+    parser_generate_logs.add_argument(
+        "--noise_fraction",
+        type=float,
+        default=0.5,
+        help="chance that a message is something other than a pokeslot post",
+    )
+    parser_generate_logs.add_argument(
+        "--shiny_chance",
+        type=float,
+        default=0.01,
+        help="chance that a won pokemon is shiny",
+    )
+    parser_generate_logs.add_argument(
+        "--giovanni_chance",
+        type=float,
+        default=0.01,
+        help="chance that a slot row that was not won shows Giovanni",
+    )
+    parser_generate_logs.add_argument(
+        "--six_line_chance",
+        type=float,
+        default=0.1,
+        help="chance that a pokeslot post without an ultra beast win still shows the ultra beast row",
+    )
 
     args = parser.parse_args(argv)
 
+    if args.command == "simulate" and args.target_ci is not None:
+        if args.exact:
+            parser_simulate.error("--target_ci can not be used with --exact")
+        if args.target_ci <= 0.0:
+            parser_simulate.error("--target_ci must be positive")
+        if not 0.0 < args.confidence < 1.0:
+            parser_simulate.error("--confidence must be between 0 and 1")
+
+    if args.command == "generate_logs":
+        if args.num_files < 1:
+            parser_generate_logs.error("--num_files must be at least 1")
+        if args.num_messages < 0:
+            parser_generate_logs.error("--num_messages can not be negative")
+
+    if args.command == "compare" and not 0.0 < args.confidence < 1.0:
+        parser_compare.error("--confidence must be between 0 and 1")
+
+    if args.command == "estimate_stats":
+        if (args.watch is None) == (len(args.logs_json) == 0):
+            parser_estimate_stats.error(
+                "give either logs_json or --watch, but not both"
+            )
+        if args.watch is not None and (
+            args.output_results_csv is not None
+            or args.bucket is not None
+            or args.cache_dir is not None
+        ):
+            parser_estimate_stats.error(
+                "--output_results_csv, --bucket, and --cache_dir can not be used with --watch"
+            )
+        if not 0.0 < args.confidence < 1.0:
+            parser_estimate_stats.error("--confidence must be between 0 and 1")
+
     if args.command == "pokemon_info":
         pokemon_info(args)
     elif args.command == "simulate":
         simulate(args)
+    elif args.command == "compare":
+        compare(args)
+    elif args.command == "sweep":
+        sweep(args)
     elif args.command == "estimate_stats":
         estimate_stats(args)
+    elif args.command == "generate_logs":
+        generate_logs(args)
+    elif args.command == "benchmark":
+        benchmark(args)
+    elif args.command == "serve":
+        serve(args)
     elif args.command == None:
         parser.print_help()
 
@@ -109,6 +550,8 @@ def datetime_obj(datetime_str: str) -> datetime.datetime:
 
 
 def pokemon_info(args: argparse.Namespace) -> None:
+    import pandas as pd
+
     data = pd.read_csv(args.pokemon_csv)
 
     print(data.groupby(["rarity"]).describe())
@@ -125,38 +568,43 @@ def pokemon_info(args: argparse.Namespace) -> None:
 
 
 def estimate_stats(args: argparse.Namespace) -> None:
-    # Parse the Discord log JSON files and pull out the information we want
-    all_results = []
-    for log_filepath in args.logs_json:
-        with open(log_filepath, "r") as input_stream:
-            log_dict = json.load(input_stream)
-
-        assert "messages" in log_dict
-
-        mudae_posts = [
-            msg
-            for msg in log_dict["messages"]
-            if args.mudae_bot_username in msg["author"]["name"]
-        ]
+    if args.watch is not None:
+        watch_estimate_stats(args)
+
+        return
+
+    # Parse the Discord log JSON files and pull out the information we want. The results
+    # are kept in a PokeslotResultTable and sorted by time to make the data easier to
+    # reason about and work with.
+    cache = ParsedLogCache.open(args.cache_dir) if args.cache_dir is not None else None
+    read_file = functools.partial(
+        read_sorted_pokeslot_results,
+        mudae_bot_username=args.mudae_bot_username,
+        cache=cache,
+        time_range=TimestampRange.from_datetimes(
+            args.start_datetime, args.end_datetime
+        ),
+    )
+    log_files = map_log_files(read_file, args.logs_json, args.workers)
 
-        results = [
-            PokeslotResult.from_dict(msg)
-            for msg in mudae_posts
-            if msg["content"].startswith(":")
-            and "pokéduel" not in msg["content"]
-            and "\n" in msg["content"]
-        ]
-        all_results.extend(results)
+    results_by_file = [log_file.results for log_file in log_files]
+
+    if cache is not None:
+        for log_filepath, log_file in zip(args.logs_json, log_files):
+            assert log_file.file_info is not None
+
+            cache.index[os.path.abspath(log_filepath)] = log_file.file_info
+        cache.write_index()
+
+        num_cached = sum((1 for log_file in log_files if log_file.from_cache))
+        print(
+            f"Loaded {num_cached} log files from cache, parsed {len(log_files) - num_cached}"
+        )
 
-    # Sort the results by time to make the data easier to reason about and work with
-    all_results.sort(key=lambda pr: pr.timestamp)
+    all_results = PokeslotResultTable.concatenate(results_by_file).sorted_by_timestamp()
 
     # Filter down to the time period we are interested in
-    all_results = [
-        r
-        for r in all_results
-        if within_optional_range(r.timestamp, args.start_datetime, args.end_datetime)
-    ]
+    all_results = all_results.within_range(args.start_datetime, args.end_datetime)
 
     # Output results if requested
     if args.output_results_csv is not None:
@@ -166,496 +614,4207 @@ def estimate_stats(args: argparse.Namespace) -> None:
         print("Wrote results csv to:", args.output_results_csv)
 
     # Calculate and print summary information
-    earliest = all_results[0].timestamp
-    latest = all_results[-1].timestamp
+    stats = SlotStatsAccumulator()
+    stats.add_table(all_results)
 
-    print(f"Time range: {earliest}  to  {latest}")
+    if stats.num_rolls == 0:
+        print("No pokeslot results found in the given logs and time range")
 
-    common_count = sum(
-        (1 for r in all_results if r.common_result.won_pokemon is not None)
-    )
-    common_percent = common_count / float(len(all_results))
-    uncommon_count = sum(
-        (1 for r in all_results if r.uncommon_result.won_pokemon is not None)
-    )
-    uncommon_percent = uncommon_count / float(len(all_results))
-    rare_count = sum((1 for r in all_results if r.rare_result.won_pokemon is not None))
-    rare_percent = rare_count / float(len(all_results))
-    very_rare_count = sum(
-        (1 for r in all_results if r.very_rare_result.won_pokemon is not None)
-    )
-    very_rare_percent = very_rare_count / float(len(all_results))
-    legendary_count = sum(
-        (1 for r in all_results if r.legendary_result.won_pokemon is not None)
-    )
-    legendary_percent = legendary_count / float(len(all_results))
-    ultra_beast_count = sum(
-        (1 for r in all_results if r.ultra_beast_result.won_pokemon is not None)
-    )
-    ultra_beast_percent = ultra_beast_count / float(len(all_results))
+        sys.exit(1)
 
-    print(f"Common:  \t{common_percent}\t({common_count} / {len(all_results)})")
-    print(f"Uncommon:\t{uncommon_percent}\t({uncommon_count} / {len(all_results)})")
-    print(f"Rare:    \t{rare_percent}\t({rare_count} / {len(all_results)})")
-    print(f"Very rare:\t{very_rare_percent}\t({very_rare_count} / {len(all_results)})")
-    print(f"Legendary:\t{legendary_percent}\t({legendary_count} / {len(all_results)})")
-    print(
-        f"Ultra beast:\t{ultra_beast_percent}\t({ultra_beast_count} / {len(all_results)})"
-    )
+    write_probabilities(args, stats, SlotStatsTimeSeries.from_table(all_results, "day"))
 
-    common_shiny_count, common_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.common_result.won_pokemon
-    )
-    uncommon_shiny_count, uncommon_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.uncommon_result.won_pokemon
-    )
-    rare_shiny_count, rare_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.rare_result.won_pokemon
-    )
-    very_rare_shiny_count, very_rare_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.very_rare_result.won_pokemon
-    )
-    legendary_shiny_count, legendary_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.legendary_result.won_pokemon
-    )
-    ultra_beast_shiny_count, ultra_beast_shiny_percent = calc_shiny_count_and_rate(
-        all_results, lambda r: r.ultra_beast_result.won_pokemon
-    )
+    # Estimate the rates over time, if requested
+    if args.bucket is not None:
+        time_series = SlotStatsTimeSeries.from_table(all_results, args.bucket)
 
-    print("\nShiny rates")
+        with open(args.output_buckets_csv, "w") as output_stream:
+            time_series.write_csv(output_stream)
 
-    print(
-        f"Common:   \t{common_shiny_percent}\t({common_shiny_count} / {common_count})"
-    )
-    print(
-        f"Uncommon: \t{uncommon_shiny_percent}\t({uncommon_shiny_count} / {uncommon_count})"
-    )
-    print(f"Rare:     \t{rare_shiny_percent}\t({rare_shiny_count} / {rare_count})")
-    print(
-        f"Very rare:\t{very_rare_shiny_percent}\t({very_rare_shiny_count} / {very_rare_count})"
-    )
-    print(
-        f"Legendary:\t{legendary_shiny_percent}\t({legendary_shiny_count} / {legendary_count})"
-    )
-    print(
-        f"Ultra beast:\t{ultra_beast_shiny_percent}\t({ultra_beast_shiny_count} / {ultra_beast_count})"
-    )
+        print(f"Wrote {args.bucket} rates csv to:", args.output_buckets_csv)
 
-    giovanni_common_count = sum(
-        (1 for r in all_results if r.common_result.stolen_by_giovanni == True)
-    )
-    giovanni_common_percent = giovanni_common_count / float(len(all_results))
-    giovanni_uncommon_count = sum(
-        (1 for r in all_results if r.uncommon_result.stolen_by_giovanni)
-    )
-    giovanni_uncommon_percent = giovanni_uncommon_count / float(len(all_results))
-    giovanni_rare_count = sum(
-        (1 for r in all_results if r.rare_result.stolen_by_giovanni)
-    )
-    giovanni_rare_percent = giovanni_rare_count / float(len(all_results))
-    giovanni_very_rare_count = sum(
-        (1 for r in all_results if r.very_rare_result.stolen_by_giovanni)
-    )
-    giovanni_very_rare_percent = giovanni_very_rare_count / float(len(all_results))
-    giovanni_legendary_count = sum(
-        (1 for r in all_results if r.legendary_result.stolen_by_giovanni)
-    )
-    giovanni_legendary_percent = giovanni_legendary_count / float(len(all_results))
-    giovanni_ultra_beast_count = sum(
-        (1 for r in all_results if r.ultra_beast_result.stolen_by_giovanni)
-    )
-    giovanni_ultra_beast_percent = giovanni_ultra_beast_count / float(len(all_results))
+        if args.output_buckets_json is not None:
+            with open(args.output_buckets_json, "w") as output_stream:
+                time_series.write_json(output_stream)
 
-    print("")
-    print("Stolen by Giovanni:")
-    print(
-        f"Common:  \t{giovanni_common_percent}\t({giovanni_common_count} / {len(all_results)})"
-    )
-    print(
-        f"Uncommon:\t{giovanni_uncommon_percent}\t({giovanni_uncommon_count} / {len(all_results)})"
-    )
-    print(
-        f"Rare:    \t{giovanni_rare_percent}\t({giovanni_rare_count} / {len(all_results)})"
-    )
-    print(
-        f"Very rare:\t{giovanni_very_rare_percent}\t({giovanni_very_rare_count} / {len(all_results)})"
-    )
-    print(
-        f"Legendary:\t{giovanni_legendary_percent}\t({giovanni_legendary_count} / {len(all_results)})"
+            print(f"Wrote {args.bucket} rates to:", args.output_buckets_json)
+
+        if args.output_buckets_plot is not None:
+            time_series.write_plot(args.output_buckets_plot)
+
+            print("Output:", args.output_buckets_plot)
+
+
+def write_probabilities(
+    args: argparse.Namespace,
+    stats: "SlotStatsAccumulator",
+    daily_stats: "SlotStatsTimeSeries",
+) -> None:
+    stats.print_summary()
+
+    intervals = ProbabilityIntervals.calculate(
+        stats,
+        daily_stats,
+        args.confidence,
+        args.bootstrap_samples,
+        args.rng_seed,
+        args.workers,
     )
-    print(
-        f"Ultra beast:\t{giovanni_ultra_beast_percent}\t({giovanni_ultra_beast_count} / {len(all_results)})"
+    intervals.print_summary()
+
+    # Output results to a data file, with the intervals alongside the probabilities. The
+    # file is replaced all at once, so jobs reading it never see a partial update.
+    data: Dict[str, Any] = stats.slot_machine().to_dict()
+    data["confidence_intervals"] = intervals.to_dict()
+
+    with atomic_write(args.output_probabilities_json, "w") as output_stream:
+        json.dump(data, output_stream, indent=4)
+
+    print("Wrote estimated rarity probabilities to:", args.output_probabilities_json)
+
+
+def watch_estimate_stats(args: argparse.Namespace) -> None:
+    # Keeps the daily stats of each log file in the watched directory, so that when files
+    # are added or change only those files need to be parsed. The daily stats are all
+    # that is needed to estimate the probabilities and their intervals, so the parsed
+    # results themselves are not kept.
+    time_range = TimestampRange.from_datetimes(args.start_datetime, args.end_datetime)
+    settings = {
+        "mudae_bot_username": args.mudae_bot_username,
+        "start_datetime": time_range.start,
+        "end_datetime": time_range.end,
+    }
+    state = WatchState.open(args.state_file, settings)
+
+    read_file = functools.partial(
+        read_complete_pokeslot_results,
+        mudae_bot_username=args.mudae_bot_username,
+        time_range=time_range,
     )
 
-    # Output results to a data file
-    slot_machine = SlotMachine(
-        common_percent,
-        uncommon_percent,
-        rare_percent,
-        very_rare_percent,
-        legendary_percent,
-        ultra_beast_percent,
-    )
+    # Do not pick up our own output files if they are written to the watched directory
+    ignored_filepaths = {
+        os.path.abspath(args.state_file),
+        os.path.abspath(args.output_probabilities_json),
+    }
+
+    print(f"Watching {args.watch} for log files, press Ctrl+C to stop")
+
+    # Always write the probabilities on start up, even if nothing has changed since the
+    # state was written
+    updated = True
+    try:
+        while True:
+            log_filepaths = [
+                log_filepath
+                for log_filepath in (
+                    os.path.abspath(log_filepath)
+                    for log_filepath in sorted(
+                        glob.glob(os.path.join(args.watch, "*.json"))
+                    )
+                )
+                if log_filepath not in ignored_filepaths
+            ]
+
+            if state.update(args, read_file, log_filepaths) or updated:
+                state.write(args.state_file)
+
+                daily_stats = state.daily_stats()
+                stats = SlotStatsAccumulator()
+                for day_stats in daily_stats.stats:
+                    stats.merge(day_stats)
+
+                if stats.num_rolls == 0:
+                    print("No pokeslot results found in the watched logs yet")
+                else:
+                    write_probabilities(args, stats, daily_stats)
+
+                updated = False
+
+            time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching", args.watch)
+
+
+def map_log_files(
+    read_file: Callable[[str], Any], log_filepaths: List[str], workers: int
+) -> List[Any]:
+    if workers > 1 and len(log_filepaths) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(read_file, log_filepaths))
+    else:
+        return [read_file(log_filepath) for log_filepath in log_filepaths]
+
+
+def read_complete_pokeslot_results(
+    log_filepath: str, mudae_bot_username: str, time_range: "TimestampRange"
+) -> Optional["LogFileResults"]:
+    # The exporter may still be writing the log file, in which case it is not valid JSON
+    # yet and None is returned
+    try:
+        return read_sorted_pokeslot_results(
+            log_filepath, mudae_bot_username, None, time_range
+        )
+    except (ValueError, AssertionError):
+        return None
+
+
+def read_sorted_pokeslot_results(
+    log_filepath: str,
+    mudae_bot_username: str,
+    cache: Optional["ParsedLogCache"],
+    time_range: "TimestampRange",
+) -> "LogFileResults":
+    # Note: the results may still include some outside of the time range, so they need to
+    # be filtered afterwards
+    if cache is not None:
+        return cache.read_sorted_pokeslot_results(
+            log_filepath, mudae_bot_username, time_range
+        )
+
+    # Skip the whole file if its export only covers messages outside of the time range
+    with open(log_filepath, "r") as input_stream:
+        header = JsonStreamReader(input_stream).read_entries_before("messages")
+
+    date_range = header.get("dateRange") or {}
+    if not time_range.overlaps(date_range.get("after"), date_range.get("before")):
+        return LogFileResults(PokeslotResultTable.from_results([]), None, False)
+
+    results = read_pokeslot_results(log_filepath, mudae_bot_username, time_range)
+
+    return LogFileResults(results.sorted_by_timestamp(), None, False)
+
+
+def read_pokeslot_results(
+    log_filepath: str,
+    mudae_bot_username: str,
+    time_range: Optional["TimestampRange"] = None,
+) -> "PokeslotResultTable":
+    # Streams through the messages in the log file one at a time rather than loading the
+    # whole file, since channel logs can be several GB
+    builder = PokeslotResultTableBuilder()
+    with open(log_filepath, "r") as input_stream:
+        for msg in JsonStreamReader(input_stream).iter_array_items("messages"):
+            # Check the time range before anything else, since it is the cheapest check.
+            # DiscordChatExporter writes the messages in chronological order, so once we
+            # are past the end of the range there is nothing left to read.
+            if time_range is not None and not time_range.contains(msg["timestamp"]):
+                if time_range.is_after(msg["timestamp"]):
+                    break
+
+                continue
+
+            if is_pokeslot_post(msg, mudae_bot_username):
+                builder.add(
+                    msg["timestamp"], PokeslotResult.parse_content(msg["content"])
+                )
+
+    return builder.build()
+
+
+@dataclass
+class TimestampRange:
+    # A time range with the bounds as timestamp strings in DATETIME_FORMAT. The strings
+    # are fixed width, so they sort the same way as the datetimes that they represent,
+    # and Discord timestamps can be checked against them without parsing them.
+    start: Optional[str]
+    end: Optional[str]
+
+    @staticmethod
+    def from_datetimes(
+        start: Optional[datetime.datetime], end: Optional[datetime.datetime]
+    ) -> "TimestampRange":
+        return TimestampRange(
+            start.strftime(DATETIME_FORMAT) if start is not None else None,
+            end.strftime(DATETIME_FORMAT) if end is not None else None,
+        )
+
+    def contains(self, timestamp_str: str) -> bool:
+        # The start is inclusive and the end exclusive, and the timezone is ignored
+        prefix = timestamp_str[:19]
+
+        return (self.start is None or prefix >= self.start) and (
+            self.end is None or prefix < self.end
+        )
+
+    def is_after(self, timestamp_str: str) -> bool:
+        return self.end is not None and timestamp_str[:19] >= self.end
+
+    def overlaps(self, first: Optional[str], last: Optional[str]) -> bool:
+        # Whether any timestamps between first and last (inclusive, and unbounded if
+        # None) are in the range
+        return (self.start is None or last is None or last[:19] >= self.start) and (
+            self.end is None or first is None or first[:19] < self.end
+        )
+
+
+@dataclass
+class LogFileInfo:
+    size: int
+    mtime_ns: int
+    sha256: str
+
+    # Timestamps of the earliest and latest results in the file, if it has been parsed
+    first_timestamp: Optional[str] = None
+    last_timestamp: Optional[str] = None
+
+    @staticmethod
+    def from_file(
+        log_filepath: str, previous: Optional["LogFileInfo"]
+    ) -> "LogFileInfo":
+        stat = os.stat(log_filepath)
+
+        # Only hash the file again if it looks like it has changed since it was last seen
+        if (
+            previous is not None
+            and previous.size == stat.st_size
+            and previous.mtime_ns == stat.st_mtime_ns
+        ):
+            return previous
+
+        file_hash = hashlib.sha256()
+        with open(log_filepath, "rb") as input_stream:
+            for chunk in iter(functools.partial(input_stream.read, 1 << 20), b""):
+                file_hash.update(chunk)
+
+        return LogFileInfo(stat.st_size, stat.st_mtime_ns, file_hash.hexdigest())
+
+
+@dataclass
+class LogFileResults:
+    results: "PokeslotResultTable"
+    file_info: Optional[LogFileInfo]
+    from_cache: bool
+
+
+@dataclass
+class ParsedLogCache:
+    # Stores the parsed pokeslot results of each log file as columns in an .npz file named
+    # after the hash of the file's contents. The index maps log filepaths to the size,
+    # modification time, and hash that they had when they were last read.
+    cache_dir: str
+    index: Dict[str, LogFileInfo]
+
+    FORMAT_VERSION = 2
+
+    @staticmethod
+    def open(cache_dir: str) -> "ParsedLogCache":
+        os.makedirs(cache_dir, exist_ok=True)
+
+        index: Dict[str, LogFileInfo] = {}
+
+        index_filepath = os.path.join(cache_dir, "index.json")
+        if os.path.exists(index_filepath):
+            with open(index_filepath) as input_stream:
+                data = json.load(input_stream)
+
+            if data["version"] == ParsedLogCache.FORMAT_VERSION:
+                index = {
+                    log_filepath: LogFileInfo(**entry)
+                    for log_filepath, entry in data["files"].items()
+                }
+
+        return ParsedLogCache(cache_dir, index)
+
+    def write_index(self) -> None:
+        data = {
+            "version": ParsedLogCache.FORMAT_VERSION,
+            "files": {
+                log_filepath: vars(file_info)
+                for log_filepath, file_info in sorted(self.index.items())
+            },
+        }
+
+        index_filepath = os.path.join(self.cache_dir, "index.json")
+        with atomic_write(index_filepath, "w") as output_stream:
+            json.dump(data, output_stream, indent=4)
+
+    def read_sorted_pokeslot_results(
+        self, log_filepath: str, mudae_bot_username: str, time_range: "TimestampRange"
+    ) -> LogFileResults:
+        previous = self.index.get(os.path.abspath(log_filepath))
+        file_info = LogFileInfo.from_file(log_filepath, previous)
+
+        # Skip unchanged files whose results we already know are all outside of the time
+        # range, without loading them
+        if (
+            file_info is previous
+            and file_info.first_timestamp is not None
+            and not time_range.overlaps(
+                file_info.first_timestamp, file_info.last_timestamp
+            )
+        ):
+            return LogFileResults(PokeslotResultTable.from_results([]), file_info, True)
+
+        # Which posts get parsed depends on the bot username, so it is part of the key
+        username_hash = hashlib.sha256(mudae_bot_username.encode()).hexdigest()[:16]
+        entry_filepath = os.path.join(
+            self.cache_dir,
+            f"v{ParsedLogCache.FORMAT_VERSION}-{file_info.sha256}-{username_hash}.npz",
+        )
+
+        # Parse the whole file regardless of the time range, so that the cache entry can
+        # be used for any time range
+        from_cache = os.path.exists(entry_filepath)
+        if from_cache:
+            results = PokeslotResultTable.read_npz(entry_filepath)
+        else:
+            results = read_pokeslot_results(
+                log_filepath, mudae_bot_username
+            ).sorted_by_timestamp()
+
+            with atomic_write(entry_filepath, "wb") as output_stream:
+                results.write_npz(output_stream)
+
+        if len(results) > 0:
+            file_info = dataclasses.replace(
+                file_info,
+                first_timestamp=timestamp_to_datetime(
+                    int(results.timestamps[0])
+                ).strftime(DATETIME_FORMAT),
+                last_timestamp=timestamp_to_datetime(
+                    int(results.timestamps[-1])
+                ).strftime(DATETIME_FORMAT),
+            )
+
+        return LogFileResults(results, file_info, from_cache)
+
+
+@dataclass
+class WatchedLogFile:
+    file_info: LogFileInfo
+    daily_stats: "SlotStatsTimeSeries"
+
+
+@dataclass
+class WatchState:
+    # The daily stats of each log file that estimate_stats --watch has read, along with
+    # the size, modification time, and hash that the file had when it was read. The
+    # settings that affect which results are counted are stored too, since the stats can
+    # not be reused if they change.
+    settings: Dict[str, Any]
+    files: Dict[str, WatchedLogFile]
+
+    # Log files that could not be parsed, which are only read again once they change
+    failed_files: Dict[str, LogFileInfo] = field(default_factory=dict)
+
+    FORMAT_VERSION = 1
+
+    @staticmethod
+    def open(state_filepath: str, settings: Dict[str, Any]) -> "WatchState":
+        if os.path.exists(state_filepath):
+            with open(state_filepath) as input_stream:
+                data = json.load(input_stream)
+
+            if (
+                data["version"] == WatchState.FORMAT_VERSION
+                and data["settings"] == settings
+            ):
+                return WatchState(
+                    settings,
+                    {
+                        log_filepath: WatchedLogFile(
+                            LogFileInfo(**entry["file_info"]),
+                            SlotStatsTimeSeries.from_dict(entry["daily_stats"]),
+                        )
+                        for log_filepath, entry in data["files"].items()
+                    },
+                )
+
+            print("The state file was written with different settings, so all of the")
+            print("log files will be read again")
+
+        return WatchState(settings, {})
+
+    def write(self, state_filepath: str) -> None:
+        data = {
+            "version": WatchState.FORMAT_VERSION,
+            "settings": self.settings,
+            "files": {
+                log_filepath: {
+                    "file_info": vars(watched_file.file_info),
+                    "daily_stats": watched_file.daily_stats.to_dict(),
+                }
+                for log_filepath, watched_file in sorted(self.files.items())
+            },
+        }
+
+        with atomic_write(state_filepath, "w") as output_stream:
+            json.dump(data, output_stream, indent=4)
+
+    def update(
+        self,
+        args: argparse.Namespace,
+        read_file: Callable[[str], Optional[LogFileResults]],
+        log_filepaths: List[str],
+    ) -> bool:
+        # Reads the log files that are new or have changed, and forgets the ones that have
+        # been removed. Returns whether the stats changed.
+        removed_filepaths = sorted(set(self.files) - set(log_filepaths))
+        for log_filepath in removed_filepaths:
+            print("Log file removed:", log_filepath)
+
+            del self.files[log_filepath]
+
+        changed_files = {}
+        for log_filepath in log_filepaths:
+            watched_file = self.files.get(log_filepath)
+            previous = (
+                watched_file.file_info
+                if watched_file is not None
+                else self.failed_files.get(log_filepath)
+            )
+            file_info = LogFileInfo.from_file(log_filepath, previous)
+
+            if previous is None or file_info.sha256 != previous.sha256:
+                changed_files[log_filepath] = file_info
+            elif watched_file is not None:
+                # Only the modification time changed
+                watched_file.file_info = file_info
+
+        log_files = map_log_files(read_file, list(changed_files), args.workers)
+
+        num_read = 0
+        for (log_filepath, file_info), log_file in zip(
+            changed_files.items(), log_files
+        ):
+            if log_file is None:
+                print(
+                    "Could not parse log file, will retry once it changes:",
+                    log_filepath,
+                )
+
+                self.failed_files[log_filepath] = file_info
+
+                continue
+
+            print("Log file read:", log_filepath)
+
+            results = log_file.results.within_range(
+                args.start_datetime, args.end_datetime
+            )
+            self.files[log_filepath] = WatchedLogFile(
+                file_info, SlotStatsTimeSeries.from_table(results, "day")
+            )
+            self.failed_files.pop(log_filepath, None)
+            num_read += 1
+
+        return len(removed_filepaths) > 0 or num_read > 0
+
+    def daily_stats(self) -> "SlotStatsTimeSeries":
+        return SlotStatsTimeSeries.merge(
+            "day", [watched_file.daily_stats for watched_file in self.files.values()]
+        )
+
+
+@contextlib.contextmanager
+def atomic_write(filepath: str, mode: str) -> Iterator[IO[Any]]:
+    # Write to a temporary file next to the destination and then move it into place, so
+    # that readers never see a partially written file
+    fd, temp_filepath = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(filepath)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode) as output_stream:
+            # mkstemp makes the file only readable by its owner
+            os.chmod(temp_filepath, replacement_permissions(filepath))
+
+            yield output_stream
+
+        os.replace(temp_filepath, filepath)
+    except BaseException:
+        os.remove(temp_filepath)
+
+        raise
+
+
+def replacement_permissions(filepath: str) -> int:
+    # The permissions of the file that is being replaced, or the ones that a newly
+    # created file would get if there is none. The umask can only be read by setting it,
+    # so it is set back right away.
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+
+        return 0o666 & ~umask
+
+
+def is_pokeslot_post(msg: Dict[str, Any], mudae_bot_username: str) -> bool:
+    return (
+        mudae_bot_username in msg["author"]["name"]
+        and msg["content"].startswith(":")
+        and "pokéduel" not in msg["content"]
+        and "\n" in msg["content"]
+    )
+
+
+class JsonStreamReader:
+    # Reads the entries of an array in the top level object of a JSON file one at a time,
+    # only keeping a small window of the file in memory
+
+    READ_SIZE = 1 << 16
+
+    def __init__(self, input_stream: IO[str]) -> None:
+        self.input_stream = input_stream
+        self.buffer = ""
+        self.position = 0
+        self.at_eof = False
+        self.decoder = json.JSONDecoder()
+
+    def read_entries_before(self, key: str) -> Dict[str, Any]:
+        # Reads the entries of the top level object that come before the given key
+        entries: Dict[str, Any] = {}
+
+        self.expect("{")
+        while self.peek() != "}":
+            entry_key = self.decode()
+            if entry_key == key:
+                break
+
+            self.expect(":")
+            entries[entry_key] = self.decode()
+
+            self.skip(",")
+
+        return entries
+
+    def iter_array_items(self, key: str) -> Iterator[Any]:
+        found_key = False
+
+        self.expect("{")
+        while self.peek() != "}":
+            entry_key = self.decode()
+            self.expect(":")
+
+            if entry_key == key:
+                found_key = True
+
+                self.expect("[")
+                while self.peek() != "]":
+                    yield self.decode()
+                    self.skip(",")
+                self.expect("]")
+            else:
+                self.decode()
+
+            self.skip(",")
+        self.expect("}")
+
+        assert found_key
+
+    def peek(self) -> str:
+        while True:
+            while (
+                self.position < len(self.buffer)
+                and self.buffer[self.position].isspace()
+            ):
+                self.position += 1
+
+            if self.position < len(self.buffer) or not self.read():
+                break
+
+        return self.buffer[self.position : self.position + 1]
+
+    def expect(self, char: str) -> None:
+        assert self.peek() == char
+
+        self.position += 1
+
+    def skip(self, char: str) -> None:
+        if self.peek() == char:
+            self.position += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # The value may continue past the end of what we have read so far
+                if self.read():
+                    continue
+
+                raise
+
+            # A number may also have only been partially read, in which case it stops
+            # at the end of the buffer or at the start of its fraction or exponent
+            if self.buffer[end : end + 1] in ("", ".", "e", "E") and self.read():
+                continue
+
+            self.position = end
+
+            return value
+
+    def read(self) -> bool:
+        if self.at_eof:
+            return False
+
+        # Drop the part of the buffer we are done with, and read at least as much as we
+        # already have so that a large value only gets decoded a few times
+        self.buffer = self.buffer[self.position :]
+        self.position = 0
+
+        chunk = self.input_stream.read(max(self.READ_SIZE, len(self.buffer)))
+        if chunk == "":
+            self.at_eof = True
+
+            return False
+
+        self.buffer += chunk
+
+        return True
+
+
+@dataclass
+class SlotStatsAccumulator:
+    # Win, shiny, and Giovanni counts for each slot row, in the same order as RARITIES
+    num_rolls: int = 0
+    win_counts: List[int] = field(default_factory=lambda: [0] * len(RARITIES))
+    shiny_counts: List[int] = field(default_factory=lambda: [0] * len(RARITIES))
+    giovanni_counts: List[int] = field(default_factory=lambda: [0] * len(RARITIES))
+    earliest: Optional[datetime.datetime] = None
+    latest: Optional[datetime.datetime] = None
+
+    def add_table(self, table: "PokeslotResultTable") -> None:
+        if len(table) == 0:
+            return
+
+        won = table.is_won()
+
+        self.num_rolls += len(table)
+        self.win_counts = list(
+            map(operator.add, self.win_counts, won.sum(axis=0).tolist())
+        )
+        self.shiny_counts = list(
+            map(
+                operator.add,
+                self.shiny_counts,
+                (won & table.is_shiny()).sum(axis=0).tolist(),
+            )
+        )
+        self.giovanni_counts = list(
+            map(
+                operator.add,
+                self.giovanni_counts,
+                table.is_stolen_by_giovanni().sum(axis=0).tolist(),
+            )
+        )
+
+        self.merge_time_range(
+            timestamp_to_datetime(int(table.timestamps.min())),
+            timestamp_to_datetime(int(table.timestamps.max())),
+        )
+
+    def merge(self, other: "SlotStatsAccumulator") -> None:
+        self.num_rolls += other.num_rolls
+        self.win_counts = list(map(operator.add, self.win_counts, other.win_counts))
+        self.shiny_counts = list(
+            map(operator.add, self.shiny_counts, other.shiny_counts)
+        )
+        self.giovanni_counts = list(
+            map(operator.add, self.giovanni_counts, other.giovanni_counts)
+        )
+
+        self.merge_time_range(other.earliest, other.latest)
+
+    def merge_time_range(
+        self, earliest: Optional[datetime.datetime], latest: Optional[datetime.datetime]
+    ) -> None:
+        for timestamp in [earliest, latest]:
+            if timestamp is not None:
+                if self.earliest is None or timestamp < self.earliest:
+                    self.earliest = timestamp
+                if self.latest is None or timestamp > self.latest:
+                    self.latest = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "num_rolls": self.num_rolls,
+            "win_counts": self.win_counts,
+            "shiny_counts": self.shiny_counts,
+            "giovanni_counts": self.giovanni_counts,
+            "earliest": (
+                self.earliest.strftime(DATETIME_FORMAT)
+                if self.earliest is not None
+                else None
+            ),
+            "latest": (
+                self.latest.strftime(DATETIME_FORMAT)
+                if self.latest is not None
+                else None
+            ),
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "SlotStatsAccumulator":
+        return SlotStatsAccumulator(
+            data["num_rolls"],
+            data["win_counts"],
+            data["shiny_counts"],
+            data["giovanni_counts"],
+            datetime_obj(data["earliest"]) if data["earliest"] is not None else None,
+            datetime_obj(data["latest"]) if data["latest"] is not None else None,
+        )
+
+    def win_rates(self) -> List[float]:
+        return [count / float(self.num_rolls) for count in self.win_counts]
+
+    def shiny_rates(self) -> List[float]:
+        return [
+            shiny_count / float(win_count) if win_count > 0 else 0.0
+            for shiny_count, win_count in zip(self.shiny_counts, self.win_counts)
+        ]
+
+    def giovanni_rates(self) -> List[float]:
+        return [count / float(self.num_rolls) for count in self.giovanni_counts]
+
+    def slot_machine(self) -> "SlotMachine":
+        return SlotMachine(*self.win_rates())
+
+    def print_summary(self) -> None:
+        labels = [
+            "Common:  ",
+            "Uncommon:",
+            "Rare:    ",
+            "Very rare:",
+            "Legendary:",
+            "Ultra beast:",
+        ]
+        shiny_labels = [
+            "Common:   ",
+            "Uncommon: ",
+            "Rare:     ",
+            "Very rare:",
+            "Legendary:",
+            "Ultra beast:",
+        ]
+
+        print(f"Time range: {self.earliest}  to  {self.latest}")
+
+        for label, rate, count in zip(labels, self.win_rates(), self.win_counts):
+            print(f"{label}\t{rate}\t({count} / {self.num_rolls})")
+
+        print("\nShiny rates")
+
+        for label, rate, count, win_count in zip(
+            shiny_labels, self.shiny_rates(), self.shiny_counts, self.win_counts
+        ):
+            print(f"{label}\t{rate}\t({count} / {win_count})")
+
+        print("")
+        print("Stolen by Giovanni:")
+
+        for label, rate, count in zip(
+            labels, self.giovanni_rates(), self.giovanni_counts
+        ):
+            print(f"{label}\t{rate}\t({count} / {self.num_rolls})")
+
+
+@dataclass
+class SlotStatsTimeSeries:
+    # The slot stats for each day, week, or month, in time order. Buckets without any
+    # rolls are left out.
+    bucket: str
+    bucket_starts: List[datetime.datetime]
+    stats: List[SlotStatsAccumulator]
+
+    @staticmethod
+    def from_table(table: "PokeslotResultTable", bucket: str) -> "SlotStatsTimeSeries":
+        import numpy as np
+
+        # The table is sorted by time, so each bucket's rolls are next to each other and
+        # all of the buckets can be counted at once
+        assert bucket in TIME_BUCKETS
+
+        if len(table) == 0:
+            return SlotStatsTimeSeries(bucket, [], [])
+
+        keys = time_bucket_starts(table.timestamps, bucket)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(keys)) + 1])
+        ends = np.append(starts[1:], len(table))
+
+        won = table.is_won()
+        win_counts = np.add.reduceat(won.astype(np.int64), starts, axis=0)
+        shiny_counts = np.add.reduceat(
+            (won & table.is_shiny()).astype(np.int64), starts, axis=0
+        )
+        giovanni_counts = np.add.reduceat(
+            table.is_stolen_by_giovanni().astype(np.int64), starts, axis=0
+        )
+
+        stats = [
+            SlotStatsAccumulator(
+                num_rolls,
+                bucket_win_counts,
+                bucket_shiny_counts,
+                bucket_giovanni_counts,
+                timestamp_to_datetime(earliest),
+                timestamp_to_datetime(latest),
+            )
+            for (
+                num_rolls,
+                bucket_win_counts,
+                bucket_shiny_counts,
+                bucket_giovanni_counts,
+                earliest,
+                latest,
+            ) in zip(
+                (ends - starts).tolist(),
+                win_counts.tolist(),
+                shiny_counts.tolist(),
+                giovanni_counts.tolist(),
+                table.timestamps[starts].tolist(),
+                table.timestamps[ends - 1].tolist(),
+            )
+        ]
+
+        return SlotStatsTimeSeries(
+            bucket,
+            [timestamp_to_datetime(key) for key in keys[starts].tolist()],
+            stats,
+        )
+
+    @staticmethod
+    def merge(
+        bucket: str, all_series: List["SlotStatsTimeSeries"]
+    ) -> "SlotStatsTimeSeries":
+        # Adds together the stats of the same bucket from each of the time series
+        stats_by_start: Dict[datetime.datetime, SlotStatsAccumulator] = {}
+        for series in all_series:
+            assert series.bucket == bucket
+
+            for bucket_start, stats in zip(series.bucket_starts, series.stats):
+                stats_by_start.setdefault(bucket_start, SlotStatsAccumulator()).merge(
+                    stats
+                )
+
+        bucket_starts = sorted(stats_by_start)
+
+        return SlotStatsTimeSeries(
+            bucket,
+            bucket_starts,
+            [stats_by_start[bucket_start] for bucket_start in bucket_starts],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bucket": self.bucket,
+            "buckets": [
+                {
+                    "bucket_start": bucket_start.strftime(DATETIME_FORMAT),
+                    **stats.to_dict(),
+                }
+                for bucket_start, stats in zip(self.bucket_starts, self.stats)
+            ],
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "SlotStatsTimeSeries":
+        return SlotStatsTimeSeries(
+            data["bucket"],
+            [datetime_obj(entry["bucket_start"]) for entry in data["buckets"]],
+            [SlotStatsAccumulator.from_dict(entry) for entry in data["buckets"]],
+        )
+
+    def write_csv(self, output_stream: IO[str]) -> None:
+        columns = ["bucket_start", "earliest", "latest", "num_rolls"]
+        for rarity_column in RARITY_KEYS:
+            columns += [
+                f"{rarity_column}_win_rate",
+                f"{rarity_column}_wins",
+                f"{rarity_column}_shiny_rate",
+                f"{rarity_column}_shinies",
+                f"{rarity_column}_giovanni_rate",
+                f"{rarity_column}_giovanni",
+            ]
+
+        writer = csv.writer(output_stream)
+        writer.writerow(columns)
+
+        for bucket_start, stats in zip(self.bucket_starts, self.stats):
+            assert stats.earliest is not None and stats.latest is not None
+
+            row: List[Any] = [
+                bucket_start.strftime(DATETIME_FORMAT),
+                stats.earliest.strftime(DATETIME_FORMAT),
+                stats.latest.strftime(DATETIME_FORMAT),
+                stats.num_rolls,
+            ]
+            for rarity_stats in zip(
+                stats.win_rates(),
+                stats.win_counts,
+                stats.shiny_rates(),
+                stats.shiny_counts,
+                stats.giovanni_rates(),
+                stats.giovanni_counts,
+            ):
+                row += rarity_stats
+
+            writer.writerow(row)
+
+    def write_json(self, output_stream: IO[str]) -> None:
+        data = {
+            "bucket": self.bucket,
+            "buckets": [
+                {
+                    "bucket_start": bucket_start.strftime(DATETIME_FORMAT),
+                    "earliest": stats.earliest.strftime(DATETIME_FORMAT),
+                    "latest": stats.latest.strftime(DATETIME_FORMAT),
+                    "num_rolls": stats.num_rolls,
+                    # In the same format as the probabilities json, so that a bucket's
+                    # rates can be simulated
+                    "probabilities": stats.slot_machine().to_dict(),
+                    "win_counts": dict(zip(RARITIES, stats.win_counts)),
+                    "shiny_rates": dict(zip(RARITIES, stats.shiny_rates())),
+                    "shiny_counts": dict(zip(RARITIES, stats.shiny_counts)),
+                    "giovanni_rates": dict(zip(RARITIES, stats.giovanni_rates())),
+                    "giovanni_counts": dict(zip(RARITIES, stats.giovanni_counts)),
+                }
+                for bucket_start, stats in zip(self.bucket_starts, self.stats)
+                if stats.earliest is not None and stats.latest is not None
+            ],
+        }
+
+        json.dump(data, output_stream, indent=4)
+
+    def to_data_frame(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        data = pd.DataFrame(
+            [
+                (bucket_start, rarity, win_rate)
+                for bucket_start, stats in zip(self.bucket_starts, self.stats)
+                for rarity, win_rate in zip(RARITIES, stats.win_rates())
+            ],
+            columns=["bucket_start", "rarity", "win_rate"],
+        )
+        data["rarity"] = pd.Categorical(data["rarity"], categories=RARITIES)
+
+        return data
+
+    def write_plot(self, filepath: str) -> None:
+        import plotnine as plt9
+
+        # The rarities' rates are very different in size, so each gets its own y axis
+        plot: "plt9.ggplot" = (
+            plt9.ggplot(self.to_data_frame(), plt9.aes("bucket_start", "win_rate"))
+            + plt9.geom_line()
+            + plt9.geom_point(size=0.5)
+            + plt9.facet_wrap("~rarity", ncol=2, scales="free_y")
+            + plt9.scale_x_datetime(date_labels="%b %d\n%Y")
+            + plt9.xlab(f"{self.bucket.capitalize()} starting")
+            + plt9.ylab("Win rate")
+        )
+        plot.save(
+            filepath,
+            width=PLOT_SIZE_INCHES[0],
+            height=PLOT_SIZE_INCHES[1],
+            units="in",
+            dpi=300,
+            verbose=False,
+        )
+
+
+def time_bucket_starts(
+    timestamps: "npt.NDArray[np.int64]", bucket: str
+) -> "npt.NDArray[np.int64]":
+    import numpy as np
+
+    # The timestamp of the start of the day, week, or month that each timestamp is in
+    seconds_per_day = 24 * 60 * 60
+    days = timestamps // seconds_per_day
+
+    if bucket == "day":
+        starts = days * seconds_per_day
+    elif bucket == "week":
+        # The Unix epoch was on a Thursday, 3 days after the start of its week
+        starts = (days - (days + 3) % 7) * seconds_per_day
+    elif bucket == "month":
+        starts = (
+            timestamps.astype("datetime64[s]")
+            .astype("datetime64[M]")
+            .astype("datetime64[s]")
+            .astype(np.int64)
+        )
+    else:
+        assert False
+
+    return starts
+
+
+# Number of bootstrap samples drawn at a time. The chunks do not depend on the number of
+# workers, so the same samples are drawn however many workers there are.
+BOOTSTRAP_CHUNK_SIZE = 256
+
+
+@dataclass
+class ProbabilityIntervals:
+    # Confidence intervals for the estimated win probability of each rarity, in the same
+    # order as RARITIES. The exact intervals treat every roll as independent, while the
+    # bootstrap intervals resample whole days of rolls, so they also cover the rates
+    # varying from day to day.
+    confidence: float
+    exact: List[Tuple[float, float]]
+    bootstrap: Optional[List[Tuple[float, float]]]
+    bootstrap_samples: int
+    num_days: int
+
+    @staticmethod
+    def calculate(
+        stats: SlotStatsAccumulator,
+        daily_stats: SlotStatsTimeSeries,
+        confidence: float,
+        bootstrap_samples: int,
+        rng_seed: int,
+        workers: int,
+    ) -> "ProbabilityIntervals":
+        import numpy as np
+
+        assert 0.0 < confidence < 1.0
+
+        exact = clopper_pearson_intervals(
+            np.array(stats.win_counts), stats.num_rolls, confidence
+        )
+
+        bootstrap = None
+        if bootstrap_samples > 0:
+            bootstrap_rates = bootstrap_win_rates(
+                daily_stats, bootstrap_samples, rng_seed, workers
+            )
+            tail = (1.0 - confidence) / 2.0
+            bootstrap = list(
+                zip(
+                    np.quantile(bootstrap_rates, tail, axis=0).tolist(),
+                    np.quantile(bootstrap_rates, 1.0 - tail, axis=0).tolist(),
+                )
+            )
+
+        return ProbabilityIntervals(
+            confidence, exact, bootstrap, bootstrap_samples, len(daily_stats.stats)
+        )
+
+    def print_summary(self) -> None:
+        print("")
+        print(
+            f"{self.confidence:.0%} confidence intervals (exact, bootstrap over days):"
+        )
+
+        for i, rarity in enumerate(RARITIES):
+            exact_lower, exact_upper = self.exact[i]
+            line = f"{rarity + ':':<12}\t[{exact_lower:.6f}, {exact_upper:.6f}]"
+
+            if self.bootstrap is not None:
+                bootstrap_lower, bootstrap_upper = self.bootstrap[i]
+                line += f"\t[{bootstrap_lower:.6f}, {bootstrap_upper:.6f}]"
+
+            print(line)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Keyed the same way as the probabilities that the intervals are for
+        data: Dict[str, Any] = {
+            "confidence": self.confidence,
+            "bootstrap_samples": self.bootstrap_samples,
+            "num_days": self.num_days,
+        }
+
+        for i, rarity_key in enumerate(RARITY_KEYS):
+            interval = {"exact": list(self.exact[i])}
+
+            if self.bootstrap is not None:
+                interval["bootstrap"] = list(self.bootstrap[i])
+
+            data[f"{rarity_key}_probability"] = interval
+
+        return data
+
+
+def clopper_pearson_intervals(
+    counts: "npt.NDArray[np.int64]", num_trials: int, confidence: float
+) -> List[Tuple[float, float]]:
+    import numpy as np
+    from scipy import special
+
+    # The exact binomial interval, which is always at least as wide as asked for, so it
+    # stays trustworthy for rarities with only a handful of wins. Its bounds are quantiles
+    # of beta distributions, which are taken with betaincinv since scipy.stats takes much
+    # longer to import than scipy.special.
+    tail = (1.0 - confidence) / 2.0
+    with np.errstate(invalid="ignore"):
+        lower = np.where(
+            counts == 0,
+            0.0,
+            special.betaincinv(counts, num_trials - counts + 1, tail),
+        )
+        upper = np.where(
+            counts == num_trials,
+            1.0,
+            special.betaincinv(counts + 1, num_trials - counts, 1.0 - tail),
+        )
+
+    return list(zip(lower.tolist(), upper.tolist()))
+
+
+def bootstrap_win_rates(
+    daily_stats: SlotStatsTimeSeries, num_samples: int, rng_seed: int, workers: int
+) -> "npt.NDArray[np.float64]":
+    import numpy as np
+
+    daily_rolls = np.array([stats.num_rolls for stats in daily_stats.stats])
+    daily_wins = np.array([stats.win_counts for stats in daily_stats.stats])
+
+    sample_chunk = functools.partial(
+        bootstrap_win_rates_chunk, daily_rolls, daily_wins, rng_seed
+    )
+    chunks = [
+        (start // BOOTSTRAP_CHUNK_SIZE, min(BOOTSTRAP_CHUNK_SIZE, num_samples - start))
+        for start in range(0, num_samples, BOOTSTRAP_CHUNK_SIZE)
+    ]
+
+    if workers <= 1:
+        rates = [sample_chunk(*chunk) for chunk in chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            rates = list(executor.map(sample_chunk, *zip(*chunks)))
+
+    all_rates: "npt.NDArray[np.float64]" = np.concatenate(rates)
+
+    return all_rates
+
+
+def bootstrap_win_rates_chunk(
+    daily_rolls: "npt.NDArray[np.int64]",
+    daily_wins: "npt.NDArray[np.int64]",
+    rng_seed: int,
+    chunk_id: int,
+    num_samples: int,
+) -> "npt.NDArray[np.float64]":
+    import numpy as np
+
+    # Each sample draws as many days as there are, with replacement. Rather than
+    # gathering the drawn days, the number of times each day is drawn is counted, so
+    # that the whole chunk's win and roll totals are a pair of matrix products.
+    rng = np.random.default_rng(case_seed_sequence(rng_seed, chunk_id))
+    num_days = len(daily_rolls)
+    times_drawn = rng.multinomial(
+        num_days, np.full(num_days, 1.0 / num_days), num_samples
+    )
+
+    rates: "npt.NDArray[np.float64]" = (times_drawn @ daily_wins) / (
+        times_drawn @ daily_rolls
+    )[:, np.newaxis]
+
+    return rates
+
+
+@dataclass
+class PokemonResult:
+    won_pokemon: Optional[str]
+    stolen_by_giovanni: bool
+
+
+@dataclass
+class PokeslotResult:
+    timestamp: datetime.datetime
+    common_result: PokemonResult
+    uncommon_result: PokemonResult
+    rare_result: PokemonResult
+    very_rare_result: PokemonResult
+    legendary_result: PokemonResult
+    ultra_beast_result: PokemonResult
+
+    def rarity_results(self) -> List[PokemonResult]:
+        return [
+            self.common_result,
+            self.uncommon_result,
+            self.rare_result,
+            self.very_rare_result,
+            self.legendary_result,
+            self.ultra_beast_result,
+        ]
+
+    @staticmethod
+    def multiple_write_csv(
+        all_results: Union[List["PokeslotResult"], "PokeslotResultTable"],
+        output_stream: IO[str],
+    ) -> None:
+        columns = [
+            "timestamp",
+            "common",
+            "uncommon",
+            "rare",
+            "very_rare",
+            "legendary",
+            "ultra_beast",
+        ]
+
+        writer = csv.DictWriter(output_stream, columns)
+        writer.writeheader()
+        # A table's rows are created one at a time as they are written
+        results = (
+            all_results.rows()
+            if isinstance(all_results, PokeslotResultTable)
+            else all_results
+        )
+        writer.writerows(
+            (
+                {
+                    "timestamp": result.timestamp.strftime(DATETIME_FORMAT),
+                    "common": result.common_result,
+                    "uncommon": result.uncommon_result,
+                    "rare": result.rare_result,
+                    "very_rare": result.very_rare_result,
+                    "legendary": result.legendary_result,
+                    "ultra_beast": result.ultra_beast_result,
+                }
+                for result in results
+            )
+        )
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "PokeslotResult":
+        timestamp = PokeslotResult.parse_timestamp(data["timestamp"])
+
+        return PokeslotResult(timestamp, *PokeslotResult.parse_content(data["content"]))
+
+    @staticmethod
+    def parse_content(content: str) -> List[PokemonResult]:
+        # The results for each rarity, in the same order as RARITIES
+        lines = content.split("\n")
+
+        assert len(lines) in [5, 6]
+
+        results = [PokeslotResult.parse_result_line(line) for line in lines]
+
+        if len(lines) == 5:
+            results.append(PokemonResult(None, False))
+
+        return results
+
+    @staticmethod
+    def parse_result_line(line: str) -> PokemonResult:
+        if (
+            line.endswith("\U0001f514")
+            or line.endswith(":wormholebell:")
+            or line.endswith(":shinySparkles:")
+        ):
+            pokemon_name = line.split(":")[1]
+
+            return PokemonResult(pokemon_name, False)
+        elif line.startswith(":Giovanni:"):
+            return PokemonResult(None, True)
+        else:
+            return PokemonResult(None, False)
+
+    @staticmethod
+    def parse_timestamp(timestamp_str: str) -> datetime.datetime:
+        # 2020-08-11T05:14:14.292+00:00
+        #
+        # The first 19 characters are always in DATETIME_FORMAT, which fromisoformat parses
+        # much faster than strptime does
+        return datetime.datetime.fromisoformat(timestamp_str[:19])
+
+
+@dataclass
+class PokeslotResultTable:
+    # Pokeslot results stored as columns rather than as PokeslotResult objects, so that
+    # millions of rolls only take a few bytes each and can be sorted, filtered, and
+    # counted in bulk. Each row is one roll, with the per rarity columns in the same
+    # order as RARITIES:
+    #
+    # * timestamps: seconds since the Unix epoch, ignoring the timezone in the same way
+    #   as PokeslotResult.parse_timestamp
+    # * won_pokemon: index into pokemon_names of the pokemon won in each rarity, or -1 if
+    #   none was won
+    # * flags: bit SHINY_SHIFT + i is set if the pokemon won in rarity i is shiny, and
+    #   bit GIOVANNI_SHIFT + i if rarity i was stolen by Giovanni
+    timestamps: "npt.NDArray[np.int64]"
+    won_pokemon: "npt.NDArray[np.signedinteger[Any]]"
+    flags: "npt.NDArray[np.uint16]"
+    pokemon_names: List[str]
+
+    SHINY_SHIFT = 0
+    GIOVANNI_SHIFT = 8
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @staticmethod
+    def from_results(results: Iterable["PokeslotResult"]) -> "PokeslotResultTable":
+        builder = PokeslotResultTableBuilder()
+        for result in results:
+            builder.add(result.timestamp.isoformat(), result.rarity_results())
+
+        return builder.build()
+
+    @staticmethod
+    def concatenate(tables: List["PokeslotResultTable"]) -> "PokeslotResultTable":
+        import numpy as np
+
+        # Each table has its own pokemon names, so the pokemon are renumbered to index
+        # into the combined names
+        ids_by_name: Dict[str, int] = {}
+        won_pokemon = []
+        for table in tables:
+            new_ids = np.array(
+                [
+                    ids_by_name.setdefault(name, len(ids_by_name))
+                    for name in table.pokemon_names
+                ]
+                + [-1],
+                dtype=np.int64,
+            )
+
+            # -1 indexes the -1 at the end of new_ids, so rarities that were not won
+            # stay as -1
+            won_pokemon.append(new_ids[table.won_pokemon])
+
+        return PokeslotResultTable(
+            np.concatenate([table.timestamps for table in tables]).astype(np.int64),
+            np.concatenate(won_pokemon)
+            .reshape(-1, len(RARITIES))
+            .astype(pokemon_id_dtype(len(ids_by_name))),
+            np.concatenate([table.flags for table in tables]).astype(np.uint16),
+            list(ids_by_name),
+        )
+
+    def take(self, indices: "npt.NDArray[Any]") -> "PokeslotResultTable":
+        return PokeslotResultTable(
+            self.timestamps[indices],
+            self.won_pokemon[indices],
+            self.flags[indices],
+            self.pokemon_names,
+        )
+
+    def sorted_by_timestamp(self) -> "PokeslotResultTable":
+        import numpy as np
+
+        # A stable sort, so results with the same timestamp stay in the same order
+        return self.take(np.argsort(self.timestamps, kind="stable"))
+
+    def within_range(
+        self,
+        lower_bound: Optional[datetime.datetime],
+        upper_bound: Optional[datetime.datetime],
+    ) -> "PokeslotResultTable":
+        import numpy as np
+
+        # Same bounds as TimestampRange.contains, inclusive of the start and exclusive of
+        # the end
+        keep = np.ones(len(self), dtype=bool)
+        if lower_bound is not None:
+            keep &= self.timestamps >= datetime_to_timestamp(lower_bound)
+        if upper_bound is not None:
+            keep &= self.timestamps < datetime_to_timestamp(upper_bound)
+
+        return self if np.all(keep) else self.take(keep)
+
+    def is_won(self) -> "npt.NDArray[np.bool_]":
+        won: "npt.NDArray[np.bool_]" = self.won_pokemon >= 0
+
+        return won
+
+    def is_shiny(self) -> "npt.NDArray[np.bool_]":
+        return self.flag_bits(PokeslotResultTable.SHINY_SHIFT)
+
+    def is_stolen_by_giovanni(self) -> "npt.NDArray[np.bool_]":
+        return self.flag_bits(PokeslotResultTable.GIOVANNI_SHIFT)
+
+    def flag_bits(self, shift: int) -> "npt.NDArray[np.bool_]":
+        import numpy as np
+
+        bits: "npt.NDArray[np.bool_]" = (
+            self.flags[:, np.newaxis] >> (shift + np.arange(len(RARITIES))) & 1
+        ).astype(bool)
+
+        return bits
+
+    def rows(self) -> Iterator["PokeslotResult"]:
+        # Only creates the PokeslotResult for each row as it is needed
+        is_stolen_by_giovanni = self.is_stolen_by_giovanni().tolist()
+
+        for timestamp, row_won_pokemon, row_stolen in zip(
+            self.timestamps.tolist(), self.won_pokemon.tolist(), is_stolen_by_giovanni
+        ):
+            yield PokeslotResult(
+                timestamp_to_datetime(timestamp),
+                *(
+                    PokemonResult(
+                        self.pokemon_names[pokemon_id] if pokemon_id >= 0 else None,
+                        stolen,
+                    )
+                    for pokemon_id, stolen in zip(row_won_pokemon, row_stolen)
+                ),
+            )
+
+    def write_npz(self, output_stream: IO[bytes]) -> None:
+        import numpy as np
+
+        np.savez_compressed(
+            output_stream,
+            timestamps=self.timestamps,
+            won_pokemon=self.won_pokemon,
+            flags=self.flags,
+            pokemon_names=np.array(self.pokemon_names, dtype=str),
+        )
+
+    @staticmethod
+    def read_npz(filepath: str) -> "PokeslotResultTable":
+        import numpy as np
+
+        with np.load(filepath, allow_pickle=False) as data:
+            return PokeslotResultTable(
+                data["timestamps"],
+                data["won_pokemon"],
+                data["flags"],
+                data["pokemon_names"].tolist(),
+            )
+
+
+@dataclass
+class PokeslotResultTableBuilder:
+    # Collects results one at a time in compact arrays, and then converts them into a
+    # PokeslotResultTable all at once
+    timestamps: List[str] = field(default_factory=list)
+    won_pokemon: "array.array[int]" = field(default_factory=lambda: array.array("l"))
+    flags: "array.array[int]" = field(default_factory=lambda: array.array("H"))
+    ids_by_name: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, timestamp_str: str, row_results: List["PokemonResult"]) -> None:
+        self.timestamps.append(timestamp_str[:19])
+
+        flags = 0
+        for i, row_result in enumerate(row_results):
+            if row_result.won_pokemon is None:
+                self.won_pokemon.append(-1)
+            else:
+                self.won_pokemon.append(
+                    self.ids_by_name.setdefault(
+                        row_result.won_pokemon, len(self.ids_by_name)
+                    )
+                )
+
+                if "S" in row_result.won_pokemon:
+                    flags |= 1 << (PokeslotResultTable.SHINY_SHIFT + i)
+
+            if row_result.stolen_by_giovanni:
+                flags |= 1 << (PokeslotResultTable.GIOVANNI_SHIFT + i)
+
+        self.flags.append(flags)
+
+    def build(self) -> "PokeslotResultTable":
+        import numpy as np
+
+        return PokeslotResultTable(
+            np.array(self.timestamps, dtype="datetime64[s]").astype(np.int64),
+            np.array(
+                self.won_pokemon, dtype=pokemon_id_dtype(len(self.ids_by_name))
+            ).reshape(-1, len(RARITIES)),
+            np.array(self.flags, dtype=np.uint16),
+            list(self.ids_by_name),
+        )
+
+
+def pokemon_id_dtype(num_pokemon: int) -> "np.dtype[Any]":
+    import numpy as np
+
+    # Smallest signed integer type that can hold the IDs as well as -1
+    dtype: "np.dtype[Any]" = np.min_scalar_type(-max(num_pokemon, 1))
+
+    return dtype
+
+
+def datetime_to_timestamp(value: datetime.datetime) -> int:
+    return (value - datetime.datetime(1970, 1, 1)) // datetime.timedelta(seconds=1)
+
+
+def timestamp_to_datetime(timestamp: int) -> datetime.datetime:
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=timestamp)
+
+
+def generate_logs(args: argparse.Namespace) -> None:
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    with open(args.probabilities_json) as input_stream:
+        slot_machine = SlotMachine.from_json(json.load(input_stream))
+
+    generator = DiscordLogGenerator(
+        pokemon,
+        slot_machine,
+        random.Random(args.rng_seed),
+        args.start_datetime,
+        noise_fraction=args.noise_fraction,
+        shiny_chance=args.shiny_chance,
+        giovanni_chance=args.giovanni_chance,
+        six_line_chance=args.six_line_chance,
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Split the messages as evenly as possible between the files, with each file
+    # continuing on in time from the previous one
+    messages_per_file, num_extra = divmod(args.num_messages, args.num_files)
+    for i in range(0, args.num_files):
+        log_filepath = os.path.join(
+            args.output_dir, f"log_{i:0{len(str(args.num_files - 1))}d}.json"
+        )
+        num_messages = messages_per_file + (1 if i < num_extra else 0)
+
+        with open(log_filepath, "w", encoding="utf-8") as output_stream:
+            generator.write_json(output_stream, num_messages)
+
+        print("Wrote generated log to:", log_filepath)
+
+
+@dataclass
+class DiscordLogGenerator:
+    # Generates channel logs in the DiscordChatExporter JSON format, containing Mudae
+    # pokeslot posts with results rolled from the given slot machine mixed in with other
+    # messages. The pokeslot posts are generated such that running estimate_stats on the
+    # logs recovers the slot machine's probabilities.
+    pokemon: "Pokemon"
+    slot_machine: "SlotMachine"
+    rng: random.Random
+    timestamp: datetime.datetime
+
+    # Chance that a message is something other than a pokeslot post
+    noise_fraction: float = 0.5
+    # Chance that a won pokemon is shiny
+    shiny_chance: float = 0.01
+    # Chance that a slot row that was not won shows Giovanni instead. Giovanni only
+    # takes rows that were not won so that the win rates are not changed.
+    giovanni_chance: float = 0.01
+    # Chance that a post without an ultra beast win still shows the ultra beast row,
+    # posts with an ultra beast win always have 6 lines
+    six_line_chance: float = 0.1
+    mean_seconds_between_messages: float = 60.0
+
+    next_id: int = 0
+
+    MUDAE_AUTHOR = {
+        "id": "432610292342587392",
+        "name": "Mudae",
+        "discriminator": "0807",
+        "nickname": "Mudae",
+        "color": None,
+        "isBot": True,
+        "avatarUrl": "https://cdn.discordapp.com/avatars/432610292342587392/avatar.png",
+    }
+    USER_NAMES = ["ash", "misty", "brock", "may", "dawn"]
+    USER_CONTENTS = ["$p", "$pokeslot", "$pokedex", "gg", "nice!", "so close :("]
+    MUDAE_CONTENTS = [
+        "**{user}**, the slot machine is not ready yet. Next roll in **{minutes}** min.",
+        "**{user}** has released their duplicate pokemon.",
+        ":crossed_swords: **{user}** challenged you to a pokéduel!\n:one: Accept\n:two: Decline",
+    ]
+
+    def write_json(self, output_stream: IO[str], num_messages: int) -> None:
+        # Writes the messages one at a time, so that logs of any size can be generated
+        # without holding them in memory
+        header = {
+            "guild": {"id": "1", "name": "Pokeslots", "iconUrl": None},
+            "channel": {
+                "id": "2",
+                "type": "GuildTextChat",
+                "categoryId": "3",
+                "category": "Text Channels",
+                "name": "pokeslots",
+                "topic": None,
+            },
+            "dateRange": {"after": None, "before": None},
+        }
+
+        output_stream.write("{\n")
+        for key, value in header.items():
+            output_stream.write(f"  {json.dumps(key)}: {self.indent(value, 1)},\n")
+
+        output_stream.write('  "messages": [')
+        for i, message in enumerate(self.messages(num_messages)):
+            output_stream.write(",\n    " if i > 0 else "\n    ")
+            output_stream.write(self.indent(message, 2))
+
+        output_stream.write(f'\n  ],\n  "messageCount": {num_messages}\n}}\n')
+
+    @staticmethod
+    def indent(value: Any, level: int) -> str:
+        return json.dumps(value, indent=2, ensure_ascii=False).replace(
+            "\n", "\n" + "  " * level
+        )
+
+    def messages(self, num_messages: int) -> Iterator[Dict[str, Any]]:
+        for _ in range(0, num_messages):
+            self.timestamp += datetime.timedelta(
+                milliseconds=round(
+                    self.rng.expovariate(1.0 / self.mean_seconds_between_messages)
+                    * 1000
+                )
+            )
+            self.next_id += 1
+
+            if self.rng.random() < self.noise_fraction:
+                author, content = self.noise()
+            else:
+                author, content = self.MUDAE_AUTHOR, self.pokeslot_content()
+
+            yield {
+                "id": str(self.next_id),
+                "type": "Default",
+                "timestamp": self.timestamp.isoformat(timespec="milliseconds")
+                + "+00:00",
+                "timestampEdited": None,
+                "callEndedTimestamp": None,
+                "isPinned": False,
+                "content": content,
+                "author": author,
+                "attachments": [],
+                "embeds": [],
+                "stickers": [],
+                "reactions": [],
+                "mentions": [],
+            }
+
+    def noise(self) -> Tuple[Dict[str, Any], str]:
+        user = self.rng.choice(self.USER_NAMES)
+
+        if self.rng.random() < 0.5:
+            author = {
+                "id": str(self.USER_NAMES.index(user) + 10),
+                "name": user,
+                "discriminator": "0001",
+                "nickname": user,
+                "color": None,
+                "isBot": False,
+                "avatarUrl": "https://cdn.discordapp.com/embed/avatars/0.png",
+            }
+
+            return author, self.rng.choice(self.USER_CONTENTS)
+        else:
+            content = self.rng.choice(self.MUDAE_CONTENTS).format(
+                user=user, minutes=self.rng.randint(1, 59)
+            )
+
+            return self.MUDAE_AUTHOR, content
+
+    def pokeslot_content(self) -> str:
+        lines = []
+        for (rarity_name, pokemon_in_rarity), probability in zip(
+            self.pokemon.by_rarity(), self.slot_machine.probabilities()
+        ):
+            won = self.rng.random() <= probability
+            is_ultra_beast = rarity_name == RARITIES[-1]
+
+            if is_ultra_beast and not won and self.rng.random() >= self.six_line_chance:
+                break
+
+            name = self.rng.choice(pokemon_in_rarity)
+            emoji = "".join((c for c in name.lower() if c.isalnum()))
+
+            if won:
+                if self.rng.random() < self.shiny_chance:
+                    lines.append(f":S{emoji}: **{name}** :shinySparkles:")
+                elif is_ultra_beast:
+                    lines.append(f":{emoji}: **{name}** :wormholebell:")
+                else:
+                    lines.append(f":{emoji}: **{name}** \U0001f514")
+            elif self.rng.random() < self.giovanni_chance:
+                lines.append(f":Giovanni: Giovanni stole **{name}**!")
+            else:
+                lines.append(f":{emoji}: {name}")
+
+        return "\n".join(lines)
+
+
+def simulate(args: argparse.Namespace) -> None:
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    with open(args.probabilities_json) as input_stream:
+        slot_machine = SlotMachine.from_json(json.load(input_stream))
+
+    print(len(pokemon))
+    print(slot_machine)
+
+    results: Union[SimulationData, ExactCollectionModel]
+    if args.exact:
+        if args.autorelease:
+            print("--exact does not support --autorelease")
+
+            sys.exit(1)
+
+        # Calculate the expected results
+        results = ExactCollectionModel.calculate(pokemon, slot_machine, args.num_rolls)
+        results.print_summary()
+
+        if args.exact_distribution_csv is not None:
+            results.to_distribution_data_frame().to_csv(
+                args.exact_distribution_csv, index=False
+            )
+            print("Output:", args.exact_distribution_csv)
+    elif args.summary_only or args.target_ci is not None:
+        # Run the simulation, summarizing the cases as they finish
+        summary = summarize_cases(
+            args.engine,
+            pokemon,
+            slot_machine,
+            args.num_cases if args.target_ci is None else args.max_cases,
+            args.num_rolls,
+            args.autorelease,
+            args.rng_seed,
+            args.workers,
+            target_ci=args.target_ci,
+            confidence=args.confidence,
+        )
+        summary.print_summary()
+
+        if args.target_ci is not None:
+            width = summary.widest_confidence_interval(args.confidence)
+            status = "Reached" if width <= args.target_ci else "Did not reach"
+            print(
+                f"{status} --target_ci {args.target_ci} after {summary.num_cases} cases, the widest {args.confidence:.0%} confidence interval of the mean is {width}"
+            )
+
+        write_plots(args, pokemon, summary)
+
+        return
+    else:
+        # Run the simulation
+        results = simulate_cases(
+            args.engine,
+            pokemon,
+            slot_machine,
+            args.num_cases,
+            args.num_rolls,
+            args.autorelease,
+            args.rng_seed,
+            args.workers,
+        )
+
+        for case_num_unique in results.num_unique_pokemon.tolist():
+            num_unique = case_num_unique[-1] if args.num_rolls > 0 else 0
+            print(f"{num_unique} / {len(pokemon)}, ({num_unique})")
+
+    write_plots(args, pokemon, results)
+
+
+def compare(args: argparse.Namespace) -> None:
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    slot_machines = []
+    for filepath in [args.probabilities_json_a, args.probabilities_json_b]:
+        with open(filepath) as input_stream:
+            slot_machines.append(SlotMachine.from_json(json.load(input_stream)))
+
+    print("A:", slot_machines[0], "autorelease" if args.autorelease_a else "")
+    print("B:", slot_machines[1], "autorelease" if args.autorelease_b else "")
+
+    comparison = compare_cases(
+        pokemon,
+        (slot_machines[0], args.autorelease_a),
+        (slot_machines[1], args.autorelease_b),
+        args.num_cases,
+        args.num_rolls,
+        args.rng_seed,
+        args.workers,
+    )
+    comparison.print_summary(args.confidence)
+
+    with atomic_write(args.output_csv, "w") as output_stream:
+        comparison.to_data_frame(args.confidence).to_csv(output_stream, index=False)
+    print("Output:", args.output_csv)
+
+    if args.output_plot != "":
+        comparison.write_plot(args.output_plot, args.confidence)
+        print("Output:", args.output_plot)
+
+
+def sweep(args: argparse.Namespace) -> None:
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    with open(args.probabilities_json) as input_stream:
+        slot_machine = SlotMachine.from_json(json.load(input_stream))
+
+    with open(args.grid_json) as input_stream:
+        grid = json.load(input_stream)
+
+    try:
+        points = SweepPoint.from_grid(slot_machine, grid)
+    except ValueError as e:
+        print(f"Invalid grid spec {args.grid_json}: {e}")
+
+        sys.exit(1)
+
+    cache = SweepCache.open(args.cache_dir)
+
+    catalog_hash = pokemon.catalog_hash()
+    keys = [
+        point.cache_key(catalog_hash, args.engine, args.num_cases, args.rng_seed)
+        for point in points
+    ]
+    summaries = [cache.read(key) for key in keys]
+    from_cache = [summary is not None for summary in summaries]
+
+    # Points that only differ in their number of rolls are simulated together up to the
+    # largest number of rolls, since the first rolls of the cases are the same either way
+    configs: Dict[Tuple[Tuple[float, ...], bool], int] = {}
+    for point, summary in zip(points, summaries):
+        if summary is None:
+            config = (tuple(point.slot_machine.probabilities()), point.autorelease)
+            configs[config] = max(configs.get(config, 0), point.num_rolls)
+
+    print(
+        f"{len(points)} grid points, {sum(from_cache)} cached, simulating {len(configs)} configurations"
+    )
+
+    config_summaries = dict(
+        zip(
+            configs,
+            summarize_sweep(
+                args.engine,
+                pokemon,
+                [
+                    (SlotMachine(*probabilities), autorelease, num_rolls)
+                    for (probabilities, autorelease), num_rolls in configs.items()
+                ],
+                args.num_cases,
+                args.rng_seed,
+                args.workers,
+            ),
+        )
+    )
+
+    rows = []
+    for point, key, summary in zip(points, keys, summaries):
+        if summary is None:
+            config = (tuple(point.slot_machine.probabilities()), point.autorelease)
+            summary = config_summaries[config].first_rolls(point.num_rolls)
+            cache.write(key, summary)
+
+        rows.append({**point.to_row(), **summary_row(summary)})
+
+    with atomic_write(args.output_csv, "w") as output_stream:
+        writer = csv.DictWriter(output_stream, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print("Output:", args.output_csv)
+
+
+def summary_row(summary: "SimulationSummary") -> Dict[str, Any]:
+    # Statistics of the last roll of a summary, as columns of the sweep table
+    stats = summary.num_unique_pokemon_stats
+    percentiles = histogram_quantiles(
+        summary.num_unique_pokemon_histogram[-1:], SimulationSummary.QUANTILES
+    )[0].tolist()
+
+    return {
+        "num_cases": summary.num_cases,
+        "num_unique_mean": float(stats.mean[-1]),
+        "num_unique_std": float(stats.std()[-1]),
+        "num_unique_p05": percentiles[0],
+        "num_unique_median": percentiles[1],
+        "num_unique_p95": percentiles[2],
+        **{
+            f"{key}_missing_mean": float(missing_stats.mean[-1])
+            for key, missing_stats in zip(RARITY_KEYS, summary.num_missing_stats)
+        },
+        "chance_any_new_mean": float(summary.chance_any_new_stats.mean[-1]),
+    }
+
+
+PLOT_NAMES = [
+    "num_unique_pokemon",
+    "num_missing_pokemon",
+    "chance_new_pokemon_by_rarity",
+    "chance_any_new_pokemon",
+]
+
+# Size that the plots are saved at, the same as plotnine's default figure size
+PLOT_SIZE_INCHES = (6.4, 4.8)
+
+
+@dataclass
+class PlotJob:
+    plot_name: str
+    data: "pd.DataFrame"
+    summary: bool
+    num_pokemon: int
+    filepath: str
+    dpi: int
+
+
+def write_plots(
+    args: argparse.Namespace,
+    pokemon: "Pokemon",
+    results: Union["SimulationData", "ExactCollectionModel", "SimulationSummary"],
+) -> None:
+    summary = isinstance(results, SimulationSummary)
+
+    frame_methods = {
+        "num_unique_pokemon": results.to_data_frame,
+        "num_missing_pokemon": results.to_num_missing_data_frame,
+        "chance_new_pokemon_by_rarity": results.to_data_frame_chance_new,
+        "chance_any_new_pokemon": results.to_data_frame_chance_any_new,
+    }
+
+    jobs = []
+    for plot_name in args.plots:
+        data = frame_methods[plot_name]()
+
+        # Only the first case's missing pokemon are plotted
+        if plot_name == "num_missing_pokemon" and not summary:
+            data = data[data["case_id"] == 0]
+
+        filepath = getattr(args, f"{plot_name}_plot")
+        if args.plot_format is not None:
+            filepath = f"{os.path.splitext(filepath)[0]}.{args.plot_format}"
+
+        jobs.append(
+            PlotJob(
+                plot_name,
+                downsample_plot_data(data, args.plot_dpi),
+                summary,
+                len(pokemon),
+                filepath,
+                args.plot_dpi,
+            )
+        )
+
+    # Rendering the plots takes a while, so they are rendered in parallel
+    workers = min(len(jobs), args.plot_workers)
+    if workers <= 1:
+        for job in jobs:
+            print("Output:", render_plot(job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for filepath in executor.map(render_plot, jobs):
+                print("Output:", filepath)
+
+
+def downsample_plot_data(data: "pd.DataFrame", dpi: int) -> "pd.DataFrame":
+    # A line can not show more points than there are pixels across the plot, and once
+    # the cases' lines would cover every pixel of the plot, plotting more cases does not
+    # change what can be seen. So the rolls and cases are thinned out evenly down to what
+    # can be seen at the output resolution.
+    import numpy as np
+
+    if len(data) == 0:
+        return data
+
+    width_pixels = int(PLOT_SIZE_INCHES[0] * dpi)
+    height_pixels = int(PLOT_SIZE_INCHES[1] * dpi)
+
+    roll_nums = data["roll_num"].to_numpy()
+    num_rolls = int(roll_nums.max()) + 1
+    roll_step = -(-num_rolls // width_pixels)
+    keep = (roll_nums % roll_step == 0) | (roll_nums == num_rolls - 1)
+
+    if "case_id" in data.columns:
+        case_indices = data["case_id"].astype("category").cat.codes.to_numpy()
+        num_cases = int(case_indices.max()) + 1
+        max_cases = max(1, width_pixels * height_pixels // -(-num_rolls // roll_step))
+        case_step = -(-num_cases // max_cases)
+        keep &= case_indices % case_step == 0
+
+    if np.all(keep):
+        return data
+
+    downsampled: "pd.DataFrame" = data[keep]
+
+    return downsampled
+
+
+def render_plot(job: PlotJob) -> str:
+    plot = summary_plot(job) if job.summary else simulation_plot(job)
+    plot.save(
+        job.filepath,
+        width=PLOT_SIZE_INCHES[0],
+        height=PLOT_SIZE_INCHES[1],
+        units="in",
+        dpi=job.dpi,
+        verbose=False,
+    )
+
+    return job.filepath
+
+
+def simulation_plot(job: PlotJob) -> "plt9.ggplot":
+    import plotnine as plt9
+
+    plot: "plt9.ggplot"
+    if job.plot_name == "num_unique_pokemon":
+        plot = (
+            plt9.ggplot(
+                job.data, plt9.aes("roll_num", "num_unique_pokemon", color="case_id")
+            )
+            + plt9.geom_line()
+            + plt9.geom_hline(yintercept=job.num_pokemon)
+            + plt9.ylim(0, job.num_pokemon)
+        )
+    elif job.plot_name == "num_missing_pokemon":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "num_missing", fill="rarity"))
+            + plt9.geom_area()
+            + plt9.geom_hline(yintercept=job.num_pokemon)
+            + plt9.ylim(0, job.num_pokemon)
+            + plt9.scale_fill_hue(
+                name="Rarity",
+                labels=[
+                    "Common",
+                    "Uncommon",
+                    "Rare",
+                    "Very rare",
+                    "Legendary",
+                    "Ultra beast",
+                ],
+            )
+            + plt9.xlab("Num rolls (exculding extra rolls)")
+            + plt9.ylab("Num Pokémon missing")
+        )
+    elif job.plot_name == "chance_new_pokemon_by_rarity":
+        plot = (
+            plt9.ggplot(
+                job.data, plt9.aes("roll_num", "chance_new_in_rarity", color="rarity")
+            )
+            + plt9.geom_line(size=1)
+            + plt9.ylim(0, 1.0)
+            + plt9.scale_color_hue(
+                name="Rarity",
+                labels=[
+                    "Common",
+                    "Uncommon",
+                    "Rare",
+                    "Very rare",
+                    "Legendary",
+                    "Ultra beast",
+                ],
+            )
+        )
+    elif job.plot_name == "chance_any_new_pokemon":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "chance_any_new"))
+            + plt9.geom_line()
+            + plt9.ylim(0, 1.0)
+        )
+    else:
+        assert False
+
+    return plot
+
+
+def summary_plot(job: PlotJob) -> "plt9.ggplot":
+    import plotnine as plt9
+
+    plot: "plt9.ggplot"
+    if job.plot_name == "num_unique_pokemon":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "median"))
+            + plt9.geom_ribbon(plt9.aes(ymin="p05", ymax="p95"), alpha=0.3)
+            + plt9.geom_line()
+            + plt9.geom_hline(yintercept=job.num_pokemon)
+            + plt9.ylim(0, job.num_pokemon)
+            + plt9.ylab("num_unique_pokemon (median, 5% to 95%)")
+        )
+    elif job.plot_name == "num_missing_pokemon":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "mean", fill="rarity"))
+            + plt9.geom_area()
+            + plt9.geom_hline(yintercept=job.num_pokemon)
+            + plt9.ylim(0, job.num_pokemon)
+            + plt9.scale_fill_hue(name="Rarity", labels=RARITIES)
+            + plt9.xlab("Num rolls (exculding extra rolls)")
+            + plt9.ylab("Mean num Pokémon missing")
+        )
+    elif job.plot_name == "chance_new_pokemon_by_rarity":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "median", color="rarity"))
+            + plt9.geom_ribbon(
+                plt9.aes(ymin="p05", ymax="p95", fill="rarity"), alpha=0.3, color=None
+            )
+            + plt9.geom_line(size=1)
+            + plt9.ylim(0, 1.0)
+            + plt9.scale_color_hue(name="Rarity", labels=RARITIES)
+            + plt9.scale_fill_hue(name="Rarity", labels=RARITIES)
+            + plt9.ylab("chance_new_in_rarity (median, 5% to 95%)")
+        )
+    elif job.plot_name == "chance_any_new_pokemon":
+        plot = (
+            plt9.ggplot(job.data, plt9.aes("roll_num", "median"))
+            + plt9.geom_ribbon(plt9.aes(ymin="p05", ymax="p95"), alpha=0.3)
+            + plt9.geom_line()
+            + plt9.ylim(0, 1.0)
+            + plt9.ylab("chance_any_new (median, 5% to 95%)")
+        )
+    else:
+        assert False
+
+    return plot
+
+
+# Number of cases simulated at a time when only keeping summary statistics. The chunks do
+# not depend on the number of workers, so the summaries are always merged the same way,
+# and --target_ci stops after the same chunk for any number of workers.
+SUMMARY_CHUNK_SIZE = 256
+
+
+def summarize_cases(
+    engine: str,
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    num_cases: int,
+    num_rolls: int,
+    autorelease: bool,
+    rng_seed: int,
+    workers: int,
+    target_ci: Optional[float] = None,
+    confidence: float = 0.95,
+) -> "SimulationSummary":
+    # With target_ci, num_cases is the most cases to simulate, and the simulation stops
+    # after the first chunk where the confidence intervals are narrow enough
+    summarize_chunk = functools.partial(
+        simulate_and_summarize,
+        engine,
+        pokemon,
+        slot_machine,
+        num_rolls=num_rolls,
+        autorelease=autorelease,
+        rng_seed=rng_seed,
+    )
+
+    chunks = (
+        list(range(start, min(start + SUMMARY_CHUNK_SIZE, num_cases)))
+        for start in range(0, num_cases, SUMMARY_CHUNK_SIZE)
+    )
+
+    summary = SimulationSummary.empty(pokemon, slot_machine, num_rolls)
+    for chunk_summary in map_chunks_in_order(summarize_chunk, chunks, workers):
+        summary.merge(chunk_summary)
+
+        if (
+            target_ci is not None
+            and summary.widest_confidence_interval(confidence) <= target_ci
+        ):
+            break
+
+    return summary
+
+
+Chunk = TypeVar("Chunk")
+ChunkResult = TypeVar("ChunkResult")
+
+
+def map_chunks_in_order(
+    function: Callable[[Chunk], ChunkResult],
+    chunks: Iterable[Chunk],
+    workers: int,
+) -> Iterator[ChunkResult]:
+    if workers <= 1:
+        yield from map(function, chunks)
+
+        return
+
+    # Only a couple of chunks per worker are submitted ahead of the ones being merged, so
+    # that stopping early does not leave the workers simulating every remaining chunk
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque["concurrent.futures.Future[ChunkResult]"] = collections.deque()
+        for chunk in chunks:
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+
+def simulate_and_summarize(
+    engine: str,
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    case_ids: List[int],
+    num_rolls: int,
+    autorelease: bool,
+    rng_seed: int,
+) -> "SimulationSummary":
+    simulate_chunk = simulate_numpy if engine == "numpy" else simulate_python
+    simulation_data = simulate_chunk(
+        pokemon, slot_machine, case_ids, num_rolls, autorelease, rng_seed
+    )
+
+    summary = SimulationSummary.empty(pokemon, slot_machine, num_rolls)
+    summary.add(simulation_data)
+
+    return summary
+
+
+# A slot machine, whether pokemon are autoreleased with it, and the number of rolls
+SweepConfig = Tuple["SlotMachine", bool, int]
+
+
+def summarize_sweep(
+    engine: str,
+    pokemon: "Pokemon",
+    configs: List[SweepConfig],
+    num_cases: int,
+    rng_seed: int,
+    workers: int,
+) -> List["SimulationSummary"]:
+    # The chunks of cases of every configuration share one pool of workers, and each
+    # configuration's chunks are merged in order, same as in summarize_cases
+    tasks = [
+        (config, list(range(start, min(start + SUMMARY_CHUNK_SIZE, num_cases))))
+        for config in configs
+        for start in range(0, num_cases, SUMMARY_CHUNK_SIZE)
+    ]
+    config_ids = [
+        config_id
+        for config_id in range(0, len(configs))
+        for _ in range(0, num_cases, SUMMARY_CHUNK_SIZE)
+    ]
+
+    summaries = [
+        SimulationSummary.empty(pokemon, slot_machine, num_rolls)
+        for slot_machine, _, num_rolls in configs
+    ]
+    summarize_task = functools.partial(
+        simulate_and_summarize_config, engine, pokemon, rng_seed=rng_seed
+    )
+    for config_id, chunk_summary in zip(
+        config_ids, map_chunks_in_order(summarize_task, tasks, workers)
+    ):
+        summaries[config_id].merge(chunk_summary)
+
+    return summaries
+
+
+def simulate_and_summarize_config(
+    engine: str,
+    pokemon: "Pokemon",
+    task: Tuple[SweepConfig, List[int]],
+    rng_seed: int,
+) -> "SimulationSummary":
+    (slot_machine, autorelease, num_rolls), case_ids = task
+
+    return simulate_and_summarize(
+        engine, pokemon, slot_machine, case_ids, num_rolls, autorelease, rng_seed
+    )
+
+
+# A slot machine and whether pokemon are autoreleased with it
+SimulationConfig = Tuple["SlotMachine", bool]
+
+
+def compare_cases(
+    pokemon: "Pokemon",
+    config_a: SimulationConfig,
+    config_b: SimulationConfig,
+    num_cases: int,
+    num_rolls: int,
+    rng_seed: int,
+    workers: int,
+) -> "ComparisonSummary":
+    compare_chunk = functools.partial(
+        simulate_and_compare,
+        pokemon,
+        config_a,
+        config_b,
+        num_rolls=num_rolls,
+        rng_seed=rng_seed,
+    )
+
+    chunks = (
+        list(range(start, min(start + SUMMARY_CHUNK_SIZE, num_cases)))
+        for start in range(0, num_cases, SUMMARY_CHUNK_SIZE)
+    )
+
+    comparison = ComparisonSummary.empty(num_rolls)
+    for chunk_comparison in map_chunks_in_order(compare_chunk, chunks, workers):
+        comparison.merge(chunk_comparison)
+
+    return comparison
+
+
+def simulate_and_compare(
+    pokemon: "Pokemon",
+    config_a: SimulationConfig,
+    config_b: SimulationConfig,
+    case_ids: List[int],
+    num_rolls: int,
+    rng_seed: int,
+) -> "ComparisonSummary":
+    import numpy as np
+
+    # Both configurations simulate the same cases from the same random number streams
+    # (common random numbers). The numpy engine draws the same win and pick numbers for
+    # each roll of a case whatever the probabilities are, so the two runs of a case stay
+    # in step and most of their randomness cancels out of the difference.
+    slot_machine_a, autorelease_a = config_a
+    slot_machine_b, autorelease_b = config_b
+
+    data_a = simulate_numpy(
+        pokemon, slot_machine_a, case_ids, num_rolls, autorelease_a, rng_seed
+    )
+    data_b = simulate_numpy(
+        pokemon, slot_machine_b, case_ids, num_rolls, autorelease_b, rng_seed
+    )
+
+    # The counts are stored in the smallest unsigned type that holds them, so they are
+    # made signed before subtracting to keep B doing worse than A from wrapping around
+    num_unique_a = data_a.num_unique_pokemon.astype(np.int64)
+    num_unique_b = data_b.num_unique_pokemon.astype(np.int64)
+
+    return ComparisonSummary(
+        RunningStats.from_values(num_unique_a),
+        RunningStats.from_values(num_unique_b),
+        RunningStats.from_values(num_unique_b - num_unique_a),
+    )
+
+
+def simulate_cases(
+    engine: str,
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    num_cases: int,
+    num_rolls: int,
+    autorelease: bool,
+    rng_seed: int,
+    workers: int,
+) -> "SimulationData":
+    import numpy as np
+
+    simulate_chunk = functools.partial(
+        simulate_numpy if engine == "numpy" else simulate_python,
+        pokemon,
+        slot_machine,
+        num_rolls=num_rolls,
+        autorelease=autorelease,
+        rng_seed=rng_seed,
+    )
+
+    case_ids = list(range(0, num_cases))
+    if workers <= 1:
+        return simulate_chunk(case_ids)
+
+    # Use a few chunks per worker so that the workers finish at around the same time.
+    # Each case has its own random number stream, so how the cases are chunked does not
+    # change the results.
+    num_chunks = min(num_cases, workers * 4)
+    chunks = [
+        chunk.tolist() for chunk in np.array_split(np.array(case_ids), num_chunks)
+    ]
+
+    simulation_data = SimulationData.allocate(
+        pokemon, slot_machine, case_ids, num_rolls
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk, chunk_data in zip(chunks, executor.map(simulate_chunk, chunks)):
+            simulation_data.num_unique_pokemon[chunk] = chunk_data.num_unique_pokemon
+            simulation_data.num_missing_by_rarity[chunk] = (
+                chunk_data.num_missing_by_rarity
+            )
+
+    return simulation_data
+
+
+def case_seed_sequence(rng_seed: int, case_id: int) -> "np.random.SeedSequence":
+    import numpy as np
+
+    # Same as the case_id-th child of SeedSequence(rng_seed).spawn(), so every case gets
+    # an independent stream that does not depend on which process simulates it
+    return np.random.SeedSequence(rng_seed, spawn_key=(case_id,))
+
+
+def simulate_python(
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    case_ids: List[int],
+    num_rolls: int,
+    autorelease: bool,
+    rng_seed: int,
+) -> "SimulationData":
+    simulation_data = SimulationData.allocate(
+        pokemon, slot_machine, case_ids, num_rolls
+    )
+
+    for case, case_id in zip(simulation_data.cases(), case_ids):
+        rng = random.Random(
+            int.from_bytes(
+                case_seed_sequence(rng_seed, case_id).generate_state(4).tobytes(),
+                "little",
+            )
+        )
+
+        # Note: representing roll credits as 2*num_rolls to avoid floating point issues when
+        # accounting for autorelease, which has two released pokemon yield one roll.
+
+        collection = PokemonCollection(pokemon)
+        roll_credits_times_2 = 0
+        for i in range(0, num_rolls):
+            roll_credits_times_2 += 2
+
+            while roll_credits_times_2 >= 2:
+                roll_credits_times_2 -= 2
+
+                results = slot_machine.roll_ids(pokemon, rng)
+                collection.extend_ids(results)
+
+                if autorelease:
+                    roll_credits_times_2 += collection.autorelease()
+
+            case.record(collection)
+
+    return simulation_data
+
+
+# Number of rolls worth of random draws that the numpy engine pulls from each case's
+# random number stream at a time
+NUMPY_DRAW_BLOCK_SIZE = 64
+
+
+def simulate_numpy(
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    case_ids: List[int],
+    num_rolls: int,
+    autorelease: bool,
+    rng_seed: int,
+) -> "SimulationData":
+    import numpy as np
+
+    # Runs all of the cases at once, taking the slot rows of every case that still has
+    # rolls left as 2-D (case x rarity) arrays and updating a (case x pokemon) matrix of
+    # owned counts in bulk. Pokemon are identified by their catalog IDs.
+    num_cases = len(case_ids)
+
+    sizes = np.array(pokemon.rarity_sizes, dtype=np.int64)
+    offsets = np.array(pokemon.rarity_offsets, dtype=np.int64)
+    probabilities = np.array(slot_machine.probabilities())
+
+    # Each case draws blocks of rolls from its own random number stream, and the cases
+    # then take the next roll from their block whenever they roll. So the rolls of a
+    # case are the same regardless of what other cases it is simulated alongside.
+    rngs = [
+        np.random.default_rng(case_seed_sequence(rng_seed, case_id))
+        for case_id in case_ids
+    ]
+    win_draws = np.zeros((num_cases, NUMPY_DRAW_BLOCK_SIZE, len(sizes)))
+    pick_draws = np.zeros((num_cases, NUMPY_DRAW_BLOCK_SIZE, len(sizes)), np.int64)
+    next_draw = np.full(num_cases, NUMPY_DRAW_BLOCK_SIZE)
+
+    simulation_data = SimulationData.allocate(
+        pokemon, slot_machine, case_ids, num_rolls
+    )
+
+    owned = np.zeros((num_cases, int(sizes.sum())), dtype=np.int64)
+    missing = np.tile(sizes, (num_cases, 1))
+
+    # Same roll credit accounting as simulate_python, but with one entry per case
+    roll_credits_times_2 = np.zeros(num_cases, dtype=np.int64)
+    for roll_num in range(0, num_rolls):
+        roll_credits_times_2 += 2
+
+        rolling = np.flatnonzero(roll_credits_times_2 >= 2)
+        while rolling.size > 0:
+            roll_credits_times_2[rolling] -= 2
+
+            for case in rolling[next_draw[rolling] == NUMPY_DRAW_BLOCK_SIZE]:
+                win_draws[case] = rngs[case].random(win_draws.shape[1:])
+                pick_draws[case] = offsets + rngs[case].integers(
+                    0, sizes, size=pick_draws.shape[1:]
+                )
+                next_draw[case] = 0
+
+            wins = win_draws[rolling, next_draw[rolling]] <= probabilities
+            picks = pick_draws[rolling, next_draw[rolling]]
+            next_draw[rolling] += 1
+
+            # Each case wins at most one pokemon per rarity, so the (case, pokemon) and
+            # (case, rarity) pairs below are all distinct
+            win_rows, win_rarities = np.nonzero(wins)
+            win_cases = rolling[win_rows]
+            win_pokemon = picks[win_rows, win_rarities]
+
+            already_owned = owned[win_cases, win_pokemon] > 0
+            is_new = ~already_owned
+            missing[win_cases[is_new], win_rarities[is_new]] -= 1
+
+            if autorelease:
+                owned[win_cases, win_pokemon] = 1
+                roll_credits_times_2 += np.bincount(
+                    win_cases[already_owned], minlength=num_cases
+                )
+            else:
+                owned[win_cases, win_pokemon] += 1
+
+            rolling = np.flatnonzero(roll_credits_times_2 >= 2)
+
+        simulation_data.num_missing_by_rarity[:, roll_num] = missing
+        simulation_data.num_unique_pokemon[:, roll_num] = len(pokemon) - missing.sum(
+            axis=1
+        )
+
+    return simulation_data
+
+
+def benchmark(args: argparse.Namespace) -> None:
+    import numpy as np
+    import pandas as pd
+    import plotnine as plt9
+
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    with open(args.probabilities_json) as input_stream:
+        slot_machine = SlotMachine.from_json(json.load(input_stream))
+
+    results: List[BenchmarkResult] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # The startup benchmarks run in separate processes, so their memory use cannot be
+        # traced from here
+        all_cases = itertools.chain(
+            ((case, False) for case in startup_benchmark_cases(args, temp_dir)),
+            (
+                (case, True)
+                for case in benchmark_cases(args, pokemon, slot_machine, temp_dir)
+            ),
+        )
+        for (name, params, setup), trace_memory in all_cases:
+            if args.filter is not None and args.filter not in name:
+                continue
+
+            result = run_benchmark(name, params, setup, args.repeats, trace_memory)
+            results.append(result)
+
+            summary = f"{name} {params}: {result.median_seconds():.6f}s median"
+            if result.peak_memory_bytes is not None:
+                summary += f", {result.peak_memory_bytes} bytes peak memory"
+
+            print(summary)
+
+    data = {
+        "metadata": {
+            "created": datetime.datetime.now().strftime(DATETIME_FORMAT),
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy_version": np.__version__,
+            "pandas_version": pd.__version__,
+            "plotnine_version": plt9.__version__,
+            "rng_seed": args.rng_seed,
+            "repeats": args.repeats,
+        },
+        "benchmarks": [result.to_dict() for result in results],
+    }
+
+    with open(args.output_json, "w") as output_stream:
+        json.dump(data, output_stream, indent=4)
+
+    print("Wrote benchmark results to:", args.output_json)
+
+
+# A benchmark's setup prepares its inputs and returns the function to time, so that the
+# setup is not included in the timings or the peak memory
+BenchmarkSetup = Callable[[], Callable[[], Any]]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    params: Dict[str, Any]
+    times: List[float]
+    peak_memory_bytes: Optional[int]
+
+    def median_seconds(self) -> float:
+        return statistics.median(self.times)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "params": self.params,
+            "repeats": len(self.times),
+            "min_seconds": min(self.times),
+            "median_seconds": self.median_seconds(),
+            "mean_seconds": statistics.mean(self.times),
+            "max_seconds": max(self.times),
+            "times_seconds": self.times,
+            "peak_memory_bytes": self.peak_memory_bytes,
+        }
+
+
+def run_benchmark(
+    name: str,
+    params: Dict[str, Any],
+    setup: BenchmarkSetup,
+    repeats: int,
+    trace_memory: bool,
+) -> BenchmarkResult:
+    times = []
+    for _ in range(0, repeats):
+        run = setup()
+
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    if not trace_memory:
+        return BenchmarkResult(name, params, times, None)
+
+    # Memory is measured in a separate run, since tracing allocations slows down the
+    # code being timed
+    run = setup()
+
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(name, params, times, peak_memory_bytes)
+
+
+def startup_benchmark_cases(
+    args: argparse.Namespace, temp_dir: str
+) -> Iterator[Tuple[str, Dict[str, Any], BenchmarkSetup]]:
+    # Runs commands in a new Python process, so that the timings include starting up and
+    # importing modules. Commands that do not need the heavy dependencies should stay
+    # fast, since they are run often from scripts.
+    argvs = [
+        ["--help"],
+        [
+            "generate_logs",
+            args.pokemon_csv,
+            args.probabilities_json,
+            "--num_messages=100",
+            f"--output_dir={os.path.join(temp_dir, 'startup_logs')}",
+        ],
+        [
+            "estimate_stats",
+            os.path.join(temp_dir, "startup_logs", "log_0.json"),
+            f"--output_probabilities_json={os.path.join(temp_dir, 'probabilities.json')}",
+        ],
+    ]
+    for argv in argvs:
+        command = [sys.executable, os.path.abspath(__file__)] + argv
+
+        yield "startup", {"command": argv[0]}, reusable_setup(
+            functools.partial(
+                subprocess.run, command, stdout=subprocess.DEVNULL, check=True
+            )
+        )
+
+
+def benchmark_cases(
+    args: argparse.Namespace,
+    pokemon: "Pokemon",
+    slot_machine: "SlotMachine",
+    temp_dir: str,
+) -> Iterator[Tuple[str, Dict[str, Any], BenchmarkSetup]]:
+    num_ops = args.num_ops
+
+    def rolls(rng_seed: int, num_rolls: int) -> List[List[str]]:
+        rng = random.Random(rng_seed)
+
+        return [slot_machine.roll(pokemon, rng) for _ in range(0, num_rolls)]
+
+    def collection(rng_seed: int, num_rolls: int) -> PokemonCollection:
+        pokemon_collection = PokemonCollection(pokemon)
+        for roll in rolls(rng_seed, num_rolls):
+            pokemon_collection.extend(roll)
+
+        return pokemon_collection
+
+    def setup_roll() -> Callable[[], Any]:
+        rng = random.Random(args.rng_seed)
+
+        return lambda: [slot_machine.roll(pokemon, rng) for _ in range(0, num_ops)]
+
+    yield "SlotMachine.roll", {"num_ops": num_ops}, setup_roll
+
+    def setup_roll_ids() -> Callable[[], Any]:
+        rng = random.Random(args.rng_seed)
+
+        return lambda: [slot_machine.roll_ids(pokemon, rng) for _ in range(0, num_ops)]
+
+    yield "SlotMachine.roll_ids", {"num_ops": num_ops}, setup_roll_ids
+
+    def setup_extend() -> Callable[[], Any]:
+        pokemon_collection = PokemonCollection(pokemon)
+        new_pokemon = rolls(args.rng_seed, num_ops)
+
+        def extend() -> None:
+            for roll in new_pokemon:
+                pokemon_collection.extend(roll)
+
+        return extend
+
+    yield "PokemonCollection.extend", {"num_ops": num_ops}, setup_extend
+
+    def setup_extend_ids() -> Callable[[], Any]:
+        pokemon_collection = PokemonCollection(pokemon)
+        new_pokemon = [
+            [pokemon.ids_by_name[name] for name in roll]
+            for roll in rolls(args.rng_seed, num_ops)
+        ]
+
+        def extend_ids() -> None:
+            for roll in new_pokemon:
+                pokemon_collection.extend_ids(roll)
+
+        return extend_ids
+
+    yield "PokemonCollection.extend_ids", {"num_ops": num_ops}, setup_extend_ids
+
+    # Each collection is released once, after enough rolls to have built up duplicates
+    def setup_autorelease() -> Callable[[], Any]:
+        collections = [
+            collection(args.rng_seed + i, 100) for i in range(0, num_ops // 100)
+        ]
+
+        return lambda: [c.autorelease() for c in collections]
+
+    yield "PokemonCollection.autorelease", {
+        "num_ops": num_ops // 100,
+        "rolls_per_collection": 100,
+    }, setup_autorelease
+
+    pokemon_collection = collection(args.rng_seed, 1000)
+
+    def num_missing_by_rarity() -> Any:
+        return [
+            pokemon_collection.num_missing_by_rarity(pokemon) for _ in range(0, num_ops)
+        ]
+
+    def chance_get_new_pokemon_by_rarity() -> Any:
+        return [
+            pokemon_collection.chance_get_new_pokemon_by_rarity(pokemon, slot_machine)
+            for _ in range(0, num_ops)
+        ]
+
+    yield "PokemonCollection.num_missing_by_rarity", {
+        "num_ops": num_ops
+    }, reusable_setup(num_missing_by_rarity)
+    yield "PokemonCollection.chance_get_new_pokemon_by_rarity", {
+        "num_ops": num_ops
+    }, reusable_setup(chance_get_new_pokemon_by_rarity)
+
+    def log_generator() -> DiscordLogGenerator:
+        return DiscordLogGenerator(
+            pokemon,
+            slot_machine,
+            random.Random(args.rng_seed),
+            datetime.datetime(2020, 8, 11),
+        )
+
+    messages = log_generator().messages(num_ops)
+    posts = [msg for msg in messages if is_pokeslot_post(msg, "Muda")]
+    lines = [line for msg in posts for line in msg["content"].split("\n")]
+
+    def from_dict() -> Any:
+        return [PokeslotResult.from_dict(msg) for msg in posts]
+
+    def parse_result_line() -> Any:
+        return [PokeslotResult.parse_result_line(line) for line in lines]
+
+    yield "PokeslotResult.from_dict", {"num_ops": len(posts)}, reusable_setup(from_dict)
+    yield "PokeslotResult.parse_result_line", {"num_ops": len(lines)}, reusable_setup(
+        parse_result_line
+    )
+
+    for num_cases in args.simulate_scales:
+        simulation_data = simulate_cases(
+            "numpy", pokemon, slot_machine, num_cases, 100, False, args.rng_seed, 1
+        )
+        params = {"num_cases": num_cases, "num_rolls": 100}
+
+        for method_name in [
+            "to_data_frame",
+            "to_num_missing_data_frame",
+            "to_data_frame_chance_new",
+            "to_data_frame_chance_any_new",
+        ]:
+            yield f"SimulationData.{method_name}", params, reusable_setup(
+                getattr(simulation_data, method_name)
+            )
+
+    # End to end runs of the commands, including reading their inputs and writing their
+    # outputs
+    plot_args = [
+        f"--{plot_name}_plot={os.path.join(temp_dir, plot_name)}.png"
+        for plot_name in [
+            "num_unique_pokemon",
+            "num_missing_pokemon",
+            "chance_new_pokemon_by_rarity",
+            "chance_any_new_pokemon",
+        ]
+    ]
+    for engine in ["python", "numpy"]:
+        for num_cases in args.simulate_scales:
+            argv = [
+                "simulate",
+                args.pokemon_csv,
+                args.probabilities_json,
+                f"--rng_seed={args.rng_seed}",
+                "--num_rolls=100",
+                f"--num_cases={num_cases}",
+                f"--engine={engine}",
+            ] + plot_args
+
+            yield "simulate", {
+                "engine": engine,
+                "num_cases": num_cases,
+                "num_rolls": 100,
+            }, reusable_setup(functools.partial(run_quietly, argv))
+
+    for num_messages in args.estimate_stats_scales:
+        log_filepath = os.path.join(temp_dir, f"log_{num_messages}.json")
+        with open(log_filepath, "w", encoding="utf-8") as output_stream:
+            log_generator().write_json(output_stream, num_messages)
+
+        argv = [
+            "estimate_stats",
+            log_filepath,
+            f"--output_probabilities_json={os.path.join(temp_dir, 'probabilities.json')}",
+        ]
+
+        yield "estimate_stats", {
+            "num_messages": num_messages,
+            "cache": False,
+        }, reusable_setup(functools.partial(run_quietly, argv))
+
+        # The first run fills the cache, so the timed runs all load from it
+        cached_argv = argv + [f"--cache_dir={os.path.join(temp_dir, 'cache')}"]
+        run_quietly(cached_argv)
+
+        yield "estimate_stats", {
+            "num_messages": num_messages,
+            "cache": True,
+        }, reusable_setup(functools.partial(run_quietly, cached_argv))
+
+
+def reusable_setup(run: Callable[[], Any]) -> BenchmarkSetup:
+    # For benchmarks that do not change their inputs, so the same inputs can be used for
+    # every run
+    return lambda: run
+
+
+def run_quietly(argv: List[str]) -> None:
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(
+        io.StringIO()
+    ):
+        main(argv)
+
+
+def serve(args: argparse.Namespace) -> None:
+    with open(args.pokemon_csv) as input_stream:
+        pokemon = Pokemon.from_csv(input_stream)
+
+    with open(args.probabilities_json) as input_stream:
+        slot_machine = SlotMachine.from_json(json.load(input_stream))
+
+    service = QueryService(
+        pokemon,
+        slot_machine,
+        args.engine,
+        args.num_cases,
+        args.workers,
+        args.cache_size,
+        args.roll_limit,
+    )
+    handler = functools.partial(QueryRequestHandler, service)
+
+    server: socketserver.BaseServer
+    if args.unix_socket is not None:
+        # A socket file left behind by a previous run would stop the server from starting
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+        server = socketserver.ThreadingUnixStreamServer(args.unix_socket, handler)
+        address = args.unix_socket
+    else:
+        server = http.server.ThreadingHTTPServer((args.host, args.port), handler)
+        address = f"http://{args.host}:{args.port}"
+
+    # Each connection is handled in its own thread, since clients keep their connections
+    # open between requests. The threads do not need to finish before the server stops.
+    server.daemon_threads = True
+
+    print(f"Serving queries on {address}, press Ctrl+C to stop")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped serving")
+    finally:
+        server.server_close()
+
+        if args.unix_socket is not None:
+            os.remove(args.unix_socket)
+
+
+@dataclass
+class QueryService:
+    # Answers queries about collecting the loaded pokemon with the loaded slot machine,
+    # by simulating cases and summarizing them. The answers are cached, keyed by
+    # everything that they depend on, and the least recently used ones are dropped once
+    # there are more than cache_size of them. Queries can come from several connection
+    # threads at once, so the cache and its counters are only used while holding lock.
+    pokemon: "Pokemon"
+    slot_machine: "SlotMachine"
+    engine: str
+    num_cases: int
+    workers: int
+    cache_size: int
+    roll_limit: int
+
+    catalog_hash: str = field(init=False)
+    cache: "collections.OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = field(
+        init=False, default_factory=collections.OrderedDict
+    )
+    cache_hits: int = field(init=False, default=0)
+    cache_misses: int = field(init=False, default=0)
+    lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self.catalog_hash = self.pokemon.catalog_hash()
+
+    def query(self, path: str, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        # Returns None for unknown paths, and raises ValueError for invalid parameters
+        if path == "/info":
+            return self.info()
+
+        rng_seed = int(params.pop("rng_seed", "42"))
+        autorelease = parse_bool(params.pop("autorelease", "false"))
+
+        query: Dict[str, Any]
+        if path == "/progress":
+            query = {"num_rolls": int(required_param(params, "num_rolls"))}
+
+            if not 1 <= query["num_rolls"] <= self.roll_limit:
+                raise ValueError(
+                    f"num_rolls must be at least 1 and at most {self.roll_limit}"
+                )
+        elif path == "/completion":
+            query = {
+                "rarity": parse_rarity(required_param(params, "rarity")),
+                "probability": float(params.pop("probability", "0.9")),
+                "max_rolls": int(
+                    params.pop("max_rolls", str(min(5000, self.roll_limit)))
+                ),
+            }
+
+            if not 0.0 < query["probability"] <= 1.0:
+                raise ValueError("probability must be greater than 0 and at most 1")
+            if not 1 <= query["max_rolls"] <= self.roll_limit:
+                raise ValueError(
+                    f"max_rolls must be at least 1 and at most {self.roll_limit}"
+                )
+        else:
+            return None
+
+        if len(params) > 0:
+            raise ValueError(f"unknown parameters: {', '.join(sorted(params))}")
+
+        key = (
+            tuple(self.slot_machine.probabilities()),
+            self.catalog_hash,
+            self.engine,
+            self.num_cases,
+            path,
+            rng_seed,
+            autorelease,
+            *sorted(query.items()),
+        )
+
+        with self.lock:
+            answer = self.cache.get(key)
+            if answer is not None:
+                self.cache.move_to_end(key)
+                self.cache_hits += 1
+
+                return answer
+
+            self.cache_misses += 1
+
+        # Simulate without holding the lock, so that cached answers can be given to other
+        # clients in the meantime
+        if path == "/progress":
+            answer = self.progress(query["num_rolls"], autorelease, rng_seed)
+        else:
+            answer = self.completion(
+                query["rarity"],
+                query["probability"],
+                query["max_rolls"],
+                autorelease,
+                rng_seed,
+            )
+
+        with self.lock:
+            self.cache[key] = answer
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return answer
+
+    def info(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "num_pokemon": len(self.pokemon),
+                "catalog_hash": self.catalog_hash,
+                "probabilities": self.slot_machine.to_dict(),
+                "engine": self.engine,
+                "num_cases": self.num_cases,
+                "roll_limit": self.roll_limit,
+                "cache_size": len(self.cache),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
+
+    def summarize(
+        self, num_rolls: int, autorelease: bool, rng_seed: int
+    ) -> "SimulationSummary":
+        return summarize_cases(
+            self.engine,
+            self.pokemon,
+            self.slot_machine,
+            self.num_cases,
+            num_rolls,
+            autorelease,
+            rng_seed,
+            self.workers,
+        )
+
+    def progress(
+        self, num_rolls: int, autorelease: bool, rng_seed: int
+    ) -> Dict[str, Any]:
+        # The collection after the given number of rolls
+        summary = self.summarize(num_rolls, autorelease, rng_seed)
+
+        def last_roll_stats(
+            stats: RunningStats, histogram: "npt.NDArray[np.int64]"
+        ) -> Dict[str, float]:
+            percentiles = histogram_quantiles(
+                histogram[-1:], SimulationSummary.QUANTILES
+            )[0].tolist()
+
+            return {
+                "mean": float(stats.mean[-1]),
+                "std": float(stats.std()[-1]),
+                "p05": percentiles[0],
+                "p50": percentiles[1],
+                "p95": percentiles[2],
+            }
+
+        return {
+            "num_rolls": num_rolls,
+            "autorelease": autorelease,
+            "rng_seed": rng_seed,
+            "num_cases": summary.num_cases,
+            "num_pokemon": len(self.pokemon),
+            "num_unique_pokemon": last_roll_stats(
+                summary.num_unique_pokemon_stats, summary.num_unique_pokemon_histogram
+            ),
+            "num_missing_by_rarity": {
+                rarity: last_roll_stats(stats, histogram)
+                for rarity, stats, histogram in zip(
+                    RARITIES, summary.num_missing_stats, summary.num_missing_histograms
+                )
+            },
+            "chance_any_new_pokemon": float(summary.chance_any_new_stats.mean[-1]),
+        }
+
+    def completion(
+        self,
+        rarity: Optional[str],
+        probability: float,
+        max_rolls: int,
+        autorelease: bool,
+        rng_seed: int,
+    ) -> Dict[str, Any]:
+        # The number of rolls until the given share of cases own every pokemon of the
+        # rarity, or every pokemon if the rarity is None
+        import numpy as np
+
+        summary = self.summarize(max_rolls, autorelease, rng_seed)
+
+        if rarity is None:
+            num_complete = summary.num_unique_pokemon_histogram[:, len(self.pokemon)]
+        else:
+            num_complete = summary.num_missing_histograms[RARITIES.index(rarity)][:, 0]
+
+        chance_complete = num_complete / summary.num_cases
+        reached = np.flatnonzero(chance_complete >= probability)
+
+        return {
+            "rarity": rarity if rarity is not None else "All",
+            "probability": probability,
+            "max_rolls": max_rolls,
+            "autorelease": autorelease,
+            "rng_seed": rng_seed,
+            "num_cases": summary.num_cases,
+            # None if the share of cases was not reached within max_rolls
+            "num_rolls": int(reached[0]) + 1 if len(reached) > 0 else None,
+            "chance_complete_by_max_rolls": float(chance_complete[-1]),
+        }
+
+
+class QueryRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Answers GET requests to /info, /progress, and /completion with JSON, with the
+    # query parameters in the URL. For example:
+    #
+    #   /completion?rarity=Legendary&probability=0.9
+    #   /progress?num_rolls=500&autorelease=true
+
+    # Keeps the connection open between requests, so that a client asking many questions
+    # does not need to reconnect each time
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, service: QueryService, *args: Any) -> None:
+        self.service = service
+
+        super().__init__(*args)
+
+    def setup(self) -> None:
+        # Otherwise the body of a response can be held back until the client
+        # acknowledges its headers, which takes tens of milliseconds. Unix sockets do not
+        # have Nagle's algorithm to turn off.
+        super().setup()
+
+        if isinstance(self.client_address, tuple):
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+
+        answer: Optional[Dict[str, Any]]
+        try:
+            answer = self.service.query(
+                url.path, dict(urllib.parse.parse_qsl(url.query))
+            )
+            status = 200 if answer is not None else 404
+        except ValueError as e:
+            answer = {"error": str(e)}
+            status = 400
+
+        if answer is None:
+            answer = {"error": f"unknown path: {url.path}"}
+
+        body = json.dumps(answer).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self) -> str:
+        # Clients connecting over a Unix socket do not have an address
+        if isinstance(self.client_address, tuple):
+            return str(self.client_address[0])
+
+        return "unix socket"
+
+
+def required_param(params: Dict[str, str], name: str) -> str:
+    if name not in params:
+        raise ValueError(f"missing parameter: {name}")
+
+    return params.pop(name)
+
+
+def parse_bool(value: str) -> bool:
+    if value.lower() in ["1", "true", "yes"]:
+        return True
+    elif value.lower() in ["0", "false", "no"]:
+        return False
+
+    raise ValueError(f"not a boolean: {value}")
+
+
+def parse_rarity(value: str) -> Optional[str]:
+    # Accepts the rarities as they are shown (Very rare) or as they are named in output
+    # files (very_rare), or "all" for every pokemon
+    key = value.lower().replace(" ", "_")
+    if key == "all":
+        return None
+    elif key in RARITY_KEYS:
+        return RARITIES[RARITY_KEYS.index(key)]
+
+    raise ValueError(f"unknown rarity: {value}")
+
+
+@dataclass
+class SimulationData:
+    # Results for each roll of each case, stored as preallocated arrays indexed by
+    # (case, roll) and (case, roll, rarity), with the rarities in the same order as
+    # RARITIES. The chance of getting a new pokemon only depends on the number missing,
+    # so it is calculated from that when needed rather than stored.
+    case_ids: "npt.NDArray[np.int64]"
+    num_unique_pokemon: "npt.NDArray[np.integer[Any]]"
+    num_missing_by_rarity: "npt.NDArray[np.integer[Any]]"
+    rarity_sizes: "npt.NDArray[np.int64]"
+    rarity_probabilities: "npt.NDArray[np.float64]"
+
+    @staticmethod
+    def allocate(
+        pokemon: "Pokemon",
+        slot_machine: "SlotMachine",
+        case_ids: List[int],
+        num_rolls: int,
+    ) -> "SimulationData":
+        import numpy as np
+
+        # Use the smallest integer type that can hold the counts
+        dtype = np.min_scalar_type(len(pokemon))
+
+        return SimulationData(
+            np.array(case_ids, dtype=np.int64),
+            np.zeros((len(case_ids), num_rolls), dtype=dtype),
+            np.zeros((len(case_ids), num_rolls, len(RARITIES)), dtype=dtype),
+            np.array(pokemon.rarity_sizes, dtype=np.int64),
+            np.array(slot_machine.probabilities()),
+        )
+
+    def cases(self) -> List["SimulationCase"]:
+        return [
+            SimulationCase(self.num_unique_pokemon[i], self.num_missing_by_rarity[i])
+            for i in range(0, len(self.case_ids))
+        ]
+
+    def chance_new_tables(self) -> "ChanceNewTables":
+        return chance_new_tables(
+            tuple(self.rarity_sizes.tolist()), tuple(self.rarity_probabilities.tolist())
+        )
+
+    def chance_get_new_pokemon_by_rarity(self) -> "npt.NDArray[np.float64]":
+        return self.chance_new_tables().chance_new(self.num_missing_by_rarity)
+
+    def chance_get_any_new_pokemon(self) -> "npt.NDArray[np.float64]":
+        return self.chance_new_tables().chance_any_new(self.num_missing_by_rarity)
+
+    def to_num_missing_data_frame(self) -> "pd.DataFrame":
+        return self.to_rarity_data_frame(self.num_missing_by_rarity, "num_missing")
+
+    def to_data_frame(self) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        num_cases, num_rolls = self.num_unique_pokemon.shape
+
+        data = pd.DataFrame(
+            {
+                "case_id": pd.Categorical.from_codes(
+                    np.repeat(np.arange(0, num_cases), num_rolls),
+                    categories=self.case_ids.tolist(),
+                ),
+                "roll_num": np.tile(np.arange(0, num_rolls), num_cases),
+                "num_unique_pokemon": self.num_unique_pokemon.reshape(-1),
+            }
+        )
+
+        return data
+
+    def to_data_frame_chance_new(self) -> "pd.DataFrame":
+        return self.to_rarity_data_frame(
+            self.chance_get_new_pokemon_by_rarity(), "chance_new_in_rarity"
+        )
+
+    def to_data_frame_chance_any_new(self) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        num_cases, num_rolls = self.num_unique_pokemon.shape
+
+        data = pd.DataFrame(
+            {
+                "case_id": np.repeat(self.case_ids, num_rolls),
+                "roll_num": np.tile(np.arange(0, num_rolls), num_cases),
+                "chance_any_new": self.chance_get_any_new_pokemon().reshape(-1),
+            }
+        )
+
+        return data
+
+    def to_rarity_data_frame(
+        self, values: "npt.NDArray[Any]", column_name: str
+    ) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        num_cases, num_rolls, num_rarities = values.shape
+
+        data = pd.DataFrame(
+            {
+                "case_id": np.repeat(self.case_ids, num_rolls * num_rarities),
+                "roll_num": np.tile(
+                    np.repeat(np.arange(0, num_rolls), num_rarities), num_cases
+                ),
+                "rarity": pd.Categorical.from_codes(
+                    np.tile(np.arange(0, num_rarities), num_cases * num_rolls),
+                    categories=RARITIES,
+                    ordered=True,
+                ),
+                column_name: values.reshape(-1),
+            }
+        )
+
+        return data
+
+
+# Number of equal width bins between 0 and 1 used to find the percentiles of chances
+CHANCE_HISTOGRAM_BINS = 1000
+
+
+@dataclass
+class ChanceNewTables:
+    # The chance of getting a new pokemon from each rarity's slot row on a roll only
+    # depends on how many of the rarity's pokemon are missing, so it is worked out once
+    # for every possible number missing and then looked up. The tables are indexed by
+    # (rarity, num_missing), with the rarities in the same order as RARITIES.
+    chance_none_new_by_rarity: List["npt.NDArray[np.float64]"]
+
+    # The rarities' chance of a new pokemon tables one after another, with each rarity's
+    # table starting at its offset, so that all of the rarities can be looked up at once
+    chance_new_flat: "npt.NDArray[np.float64]"
+    flat_offsets: "npt.NDArray[np.int64]"
+
+    # The chance of a new pokemon tables as lists, for looking up one value at a time
+    chance_new_lists: List[List[float]]
+
+    def chance_new(
+        self, num_missing_by_rarity: "npt.NDArray[Any]"
+    ) -> "npt.NDArray[np.float64]":
+        # num_missing_by_rarity has the rarities along its last axis
+        chance_new: "npt.NDArray[np.float64]" = self.chance_new_flat[
+            num_missing_by_rarity + self.flat_offsets
+        ]
+
+        return chance_new
+
+    def chance_any_new(
+        self, num_missing_by_rarity: "npt.NDArray[Any]"
+    ) -> "npt.NDArray[np.float64]":
+        # Multiply the rarities in order to get the same results as doing it one entry at
+        # a time
+        chance_none_new = self.chance_none_new_by_rarity[0][
+            num_missing_by_rarity[..., 0]
+        ]
+        for i in range(1, len(RARITIES)):
+            chance_none_new = (
+                chance_none_new
+                * self.chance_none_new_by_rarity[i][num_missing_by_rarity[..., i]]
+            )
+
+        any_new: "npt.NDArray[np.float64]" = 1.0 - chance_none_new
+
+        return any_new
+
+
+@functools.lru_cache(maxsize=None)
+def chance_new_tables(
+    rarity_sizes: Tuple[int, ...], rarity_probabilities: Tuple[float, ...]
+) -> ChanceNewTables:
+    import numpy as np
+
+    # Only built once for each slot machine and set of pokemon
+    chance_new_by_rarity = [
+        np.arange(0, size + 1) / size * probability
+        for size, probability in zip(rarity_sizes, rarity_probabilities)
+    ]
+
+    return ChanceNewTables(
+        [1.0 - table for table in chance_new_by_rarity],
+        np.concatenate(chance_new_by_rarity),
+        np.cumsum([0] + [size + 1 for size in rarity_sizes[:-1]]),
+        [table.tolist() for table in chance_new_by_rarity],
+    )
+
+
+@dataclass
+class RunningStats:
+    # Running per roll mean and sum of squared differences from the mean, which can be
+    # combined using the parallel algorithm from Chan et al.
+    count: int
+    mean: "npt.NDArray[np.float64]"
+    sum_squares: "npt.NDArray[np.float64]"
+
+    @staticmethod
+    def empty(num_rolls: int) -> "RunningStats":
+        import numpy as np
+
+        return RunningStats(0, np.zeros(num_rolls), np.zeros(num_rolls))
+
+    @staticmethod
+    def from_values(values: "npt.NDArray[Any]") -> "RunningStats":
+        import numpy as np
+
+        # values is indexed by (case, roll)
+        mean = values.mean(axis=0) if len(values) > 0 else np.zeros(values.shape[1])
+
+        return RunningStats(len(values), mean, ((values - mean) ** 2).sum(axis=0))
+
+    def merge(self, other: "RunningStats") -> None:
+        count = self.count + other.count
+        if count == 0:
+            return
+
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.sum_squares = (
+            self.sum_squares
+            + other.sum_squares
+            + delta**2 * (self.count * other.count / count)
+        )
+        self.count = count
+
+    def first_rolls(self, num_rolls: int) -> "RunningStats":
+        return RunningStats(
+            self.count, self.mean[:num_rolls], self.sum_squares[:num_rolls]
+        )
+
+    def std(self) -> "npt.NDArray[np.float64]":
+        import numpy as np
+
+        variance: "npt.NDArray[np.float64]" = self.sum_squares / max(self.count - 1, 1)
+
+        return np.sqrt(variance)
 
-    with open(args.output_probabilities_json, "w") as output_stream:
-        slot_machine.write_json(output_stream)
+    def confidence_interval_widths(
+        self, confidence: float
+    ) -> "npt.NDArray[np.float64]":
+        import numpy as np
+        from scipy import special
 
-    print("Wrote estimated rarity probabilities to:", args.output_probabilities_json)
+        # Width of the normal approximation confidence interval of each roll's mean, which
+        # is infinite until there are at least two values to estimate the spread from
+        if self.count < 2:
+            return np.full(len(self.mean), np.inf)
 
+        z = float(special.ndtri(0.5 + confidence / 2.0))
+        widths: "npt.NDArray[np.float64]" = 2.0 * z * self.std() / np.sqrt(self.count)
 
-def within_optional_range(
-    value: datetime.datetime,
-    lower_bound: Optional[datetime.datetime],
-    upper_bound: Optional[datetime.datetime],
-) -> bool:
-    satisfies_lower = lower_bound is None or value >= lower_bound
-    satisfies_upper = upper_bound is None or value < upper_bound
+        return widths
 
-    return satisfies_lower and satisfies_upper
 
+def histogram_quantiles(
+    histogram: "npt.NDArray[np.int64]", quantiles: List[float]
+) -> "npt.NDArray[np.int64]":
+    import numpy as np
 
-def calc_shiny_count_and_rate(
-    results: List["PokeslotResult"], get: Callable[["PokeslotResult"], Optional[str]]
-) -> Tuple[int, float]:
-    count = sum((1 for r in results if get(r) is not None))
-    shiny_count = sum(
-        (1 for r in results if get(r) is not None and "S" in cast(str, get(r)))
+    # Finds the bin of each quantile for each roll of a (roll x bin) histogram
+    cumulative = np.cumsum(histogram, axis=1)
+    totals = cumulative[:, -1:]
+
+    return np.stack(
+        [np.argmax(cumulative >= quantile * totals, axis=1) for quantile in quantiles],
+        axis=1,
     )
-    shiny_percent = shiny_count / float(count) if count > 0 else 0.0
 
-    return shiny_count, shiny_percent
 
+def add_to_histogram(
+    histogram: "npt.NDArray[np.int64]", bins: "npt.NDArray[Any]"
+) -> None:
+    import numpy as np
 
-@dataclass
-class PokemonResult:
-    won_pokemon: Optional[str]
-    stolen_by_giovanni: bool
+    # bins is indexed by (case, roll) and gives the histogram bin of each value
+    num_rolls, num_bins = histogram.shape
+
+    flat_bins = (np.arange(0, num_rolls) * num_bins + bins).reshape(-1)
+    histogram += np.bincount(flat_bins, minlength=num_rolls * num_bins).reshape(
+        histogram.shape
+    )
 
 
 @dataclass
-class PokeslotResult:
-    timestamp: datetime.datetime
-    common_result: PokemonResult
-    uncommon_result: PokemonResult
-    rare_result: PokemonResult
-    very_rare_result: PokemonResult
-    legendary_result: PokemonResult
-    ultra_beast_result: PokemonResult
+class SimulationSummary:
+    # Summary statistics of each roll across the cases that have been added so far, which
+    # only take up memory proportional to the number of rolls. The number of unique and
+    # missing pokemon are whole numbers, so their histograms have a bin for each possible
+    # value and give exact percentiles. The chance of getting any new pokemon is binned
+    # into CHANCE_HISTOGRAM_BINS bins.
+    num_pokemon: int
+    rarity_sizes: "npt.NDArray[np.int64]"
+    rarity_probabilities: "npt.NDArray[np.float64]"
+
+    num_unique_pokemon_stats: RunningStats
+    num_unique_pokemon_histogram: "npt.NDArray[np.int64]"
+    num_missing_stats: List[RunningStats]
+    num_missing_histograms: List["npt.NDArray[np.int64]"]
+    chance_any_new_stats: RunningStats
+    chance_any_new_histogram: "npt.NDArray[np.int64]"
+
+    QUANTILES = [0.05, 0.5, 0.95]
 
     @staticmethod
-    def multiple_write_csv(
-        all_results: List["PokeslotResult"], output_stream: IO[str]
-    ) -> None:
-        columns = [
-            "timestamp",
-            "common",
-            "uncommon",
-            "rare",
-            "very_rare",
-            "legendary",
-            "ultra_beast",
+    def empty(
+        pokemon: "Pokemon", slot_machine: "SlotMachine", num_rolls: int
+    ) -> "SimulationSummary":
+        import numpy as np
+
+        rarity_sizes = np.array(pokemon.rarity_sizes)
+
+        return SimulationSummary(
+            len(pokemon),
+            rarity_sizes,
+            np.array(slot_machine.probabilities()),
+            RunningStats.empty(num_rolls),
+            np.zeros((num_rolls, len(pokemon) + 1), dtype=np.int64),
+            [RunningStats.empty(num_rolls) for _ in RARITIES],
+            [np.zeros((num_rolls, size + 1), dtype=np.int64) for size in rarity_sizes],
+            RunningStats.empty(num_rolls),
+            np.zeros((num_rolls, CHANCE_HISTOGRAM_BINS), dtype=np.int64),
+        )
+
+    @property
+    def num_cases(self) -> int:
+        return self.num_unique_pokemon_stats.count
+
+    def widest_confidence_interval(self, confidence: float) -> float:
+        widths = self.num_unique_pokemon_stats.confidence_interval_widths(confidence)
+
+        return float(widths.max(initial=0.0))
+
+    def add(self, simulation_data: "SimulationData") -> None:
+        import numpy as np
+
+        num_unique = simulation_data.num_unique_pokemon
+        self.num_unique_pokemon_stats.merge(RunningStats.from_values(num_unique))
+        add_to_histogram(self.num_unique_pokemon_histogram, num_unique)
+
+        for i in range(0, len(RARITIES)):
+            num_missing = simulation_data.num_missing_by_rarity[:, :, i]
+            self.num_missing_stats[i].merge(RunningStats.from_values(num_missing))
+            add_to_histogram(self.num_missing_histograms[i], num_missing)
+
+        chance_any_new = simulation_data.chance_get_any_new_pokemon()
+        self.chance_any_new_stats.merge(RunningStats.from_values(chance_any_new))
+        add_to_histogram(
+            self.chance_any_new_histogram,
+            np.minimum(
+                (chance_any_new * CHANCE_HISTOGRAM_BINS).astype(np.int64),
+                CHANCE_HISTOGRAM_BINS - 1,
+            ),
+        )
+
+    def merge(self, other: "SimulationSummary") -> None:
+        self.num_unique_pokemon_stats.merge(other.num_unique_pokemon_stats)
+        self.num_unique_pokemon_histogram += other.num_unique_pokemon_histogram
+
+        for i in range(0, len(RARITIES)):
+            self.num_missing_stats[i].merge(other.num_missing_stats[i])
+            self.num_missing_histograms[i] += other.num_missing_histograms[i]
+
+        self.chance_any_new_stats.merge(other.chance_any_new_stats)
+        self.chance_any_new_histogram += other.chance_any_new_histogram
+
+    def first_rolls(self, num_rolls: int) -> "SimulationSummary":
+        # The summary of only the first rolls of the cases, which is the same as if the
+        # cases had only been simulated for that many rolls
+        return SimulationSummary(
+            self.num_pokemon,
+            self.rarity_sizes,
+            self.rarity_probabilities,
+            self.num_unique_pokemon_stats.first_rolls(num_rolls),
+            self.num_unique_pokemon_histogram[:num_rolls],
+            [stats.first_rolls(num_rolls) for stats in self.num_missing_stats],
+            [histogram[:num_rolls] for histogram in self.num_missing_histograms],
+            self.chance_any_new_stats.first_rolls(num_rolls),
+            self.chance_any_new_histogram[:num_rolls],
+        )
+
+    def write_npz(self, output_stream: IO[bytes]) -> None:
+        import numpy as np
+
+        arrays: Dict[str, Any] = {
+            "num_pokemon": np.array(self.num_pokemon),
+            "rarity_sizes": self.rarity_sizes,
+            "rarity_probabilities": self.rarity_probabilities,
+            "num_unique_pokemon_histogram": self.num_unique_pokemon_histogram,
+            "chance_any_new_histogram": self.chance_any_new_histogram,
+        }
+        named_stats = [
+            ("num_unique_pokemon", self.num_unique_pokemon_stats),
+            ("chance_any_new", self.chance_any_new_stats),
         ]
+        for key, stats, histogram in zip(
+            RARITY_KEYS, self.num_missing_stats, self.num_missing_histograms
+        ):
+            named_stats.append((f"{key}_missing", stats))
+            arrays[f"{key}_missing_histogram"] = histogram
 
-        writer = csv.DictWriter(output_stream, columns)
-        writer.writeheader()
-        writer.writerows(
+        for name, stats in named_stats:
+            arrays[f"{name}_count"] = np.array(stats.count)
+            arrays[f"{name}_mean"] = stats.mean
+            arrays[f"{name}_sum_squares"] = stats.sum_squares
+
+        np.savez_compressed(output_stream, **arrays)
+
+    @staticmethod
+    def read_npz(filepath: str) -> "SimulationSummary":
+        import numpy as np
+
+        with np.load(filepath, allow_pickle=False) as data:
+
+            def read_stats(name: str) -> RunningStats:
+                return RunningStats(
+                    int(data[f"{name}_count"]),
+                    data[f"{name}_mean"],
+                    data[f"{name}_sum_squares"],
+                )
+
+            return SimulationSummary(
+                int(data["num_pokemon"]),
+                data["rarity_sizes"],
+                data["rarity_probabilities"],
+                read_stats("num_unique_pokemon"),
+                data["num_unique_pokemon_histogram"],
+                [read_stats(f"{key}_missing") for key in RARITY_KEYS],
+                [data[f"{key}_missing_histogram"] for key in RARITY_KEYS],
+                read_stats("chance_any_new"),
+                data["chance_any_new_histogram"],
+            )
+
+    def print_summary(self) -> None:
+        if self.num_unique_pokemon_histogram.shape[0] == 0:
+            return
+
+        stats = self.num_unique_pokemon_stats
+        percentiles = histogram_quantiles(
+            self.num_unique_pokemon_histogram[-1:], self.QUANTILES
+        )[0]
+
+        print(
+            f"Mean {stats.mean[-1]} / {self.num_pokemon} (std {stats.std()[-1]}), (5%: {percentiles[0]}, 50%: {percentiles[1]}, 95%: {percentiles[2]}) over {self.num_cases} cases"
+        )
+
+    def to_data_frame(self) -> "pd.DataFrame":
+        return self.to_stats_data_frame(
+            self.num_unique_pokemon_stats,
+            histogram_quantiles(self.num_unique_pokemon_histogram, self.QUANTILES),
+        )
+
+    def to_num_missing_data_frame(self) -> "pd.DataFrame":
+        return self.to_rarity_stats_data_frame(
             [
-                {
-                    "timestamp": result.timestamp.strftime(DATETIME_FORMAT),
-                    "common": result.common_result,
-                    "uncommon": result.uncommon_result,
-                    "rare": result.rare_result,
-                    "very_rare": result.very_rare_result,
-                    "legendary": result.legendary_result,
-                    "ultra_beast": result.ultra_beast_result,
-                }
-                for result in all_results
-            ]
+                histogram_quantiles(histogram, self.QUANTILES)
+                for histogram in self.num_missing_histograms
+            ],
+            [1.0 for _ in RARITIES],
         )
 
-    @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "PokeslotResult":
-        timestamp = PokeslotResult.parse_timestamp(data["timestamp"])
+    def to_data_frame_chance_new(self) -> "pd.DataFrame":
+        # The chance of a new pokemon in a rarity goes up with the number missing, so its
+        # percentiles come from the percentiles of the number missing
+        return self.to_rarity_stats_data_frame(
+            [
+                histogram_quantiles(histogram, self.QUANTILES)
+                for histogram in self.num_missing_histograms
+            ],
+            (self.rarity_probabilities / self.rarity_sizes).tolist(),
+        )
 
-        content = data["content"]
-        lines = content.split("\n")
+    def to_data_frame_chance_any_new(self) -> "pd.DataFrame":
+        percentile_bins = histogram_quantiles(
+            self.chance_any_new_histogram, self.QUANTILES
+        )
 
-        assert len(lines) in [5, 6]
+        return self.to_stats_data_frame(
+            self.chance_any_new_stats,
+            (percentile_bins + 0.5) / CHANCE_HISTOGRAM_BINS,
+        )
+
+    def to_stats_data_frame(
+        self, stats: RunningStats, percentiles: "npt.NDArray[Any]"
+    ) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                "roll_num": np.arange(0, len(stats.mean)),
+                "mean": stats.mean,
+                "std": stats.std(),
+                "p05": percentiles[:, 0],
+                "median": percentiles[:, 1],
+                "p95": percentiles[:, 2],
+            }
+        )
 
-        common_result = PokeslotResult.parse_result_line(lines[0])
-        uncommon_result = PokeslotResult.parse_result_line(lines[1])
-        rare_result = PokeslotResult.parse_result_line(lines[2])
-        very_rare_result = PokeslotResult.parse_result_line(lines[3])
-        legendary_result = PokeslotResult.parse_result_line(lines[4])
+    def to_rarity_stats_data_frame(
+        self, percentiles_by_rarity: List["npt.NDArray[Any]"], scales: List[float]
+    ) -> "pd.DataFrame":
+        import pandas as pd
 
-        if len(lines) == 6:
-            ultra_beast_result = PokeslotResult.parse_result_line(lines[5])
-        else:
-            ultra_beast_result = PokemonResult(None, False)
+        data = pd.concat(
+            [
+                self.to_stats_data_frame(
+                    RunningStats(
+                        stats.count, stats.mean * scale, stats.sum_squares * scale**2
+                    ),
+                    percentiles * scale,
+                ).assign(rarity=rarity_name)
+                for rarity_name, stats, percentiles, scale in zip(
+                    RARITIES, self.num_missing_stats, percentiles_by_rarity, scales
+                )
+            ],
+            ignore_index=True,
+        )
 
-        return PokeslotResult(
-            timestamp,
-            common_result,
-            uncommon_result,
-            rare_result,
-            very_rare_result,
-            legendary_result,
-            ultra_beast_result,
+        data["rarity"] = pd.Categorical(
+            data["rarity"], categories=RARITIES, ordered=True
         )
 
+        return data
+
+
+@dataclass
+class SweepPoint:
+    # One point of a sweep's grid. scales gives the factor that each scaled probability
+    # was multiplied by, which is capped so that the probability is at most 1.
+    scales: Dict[str, float]
+    slot_machine: "SlotMachine"
+    autorelease: bool
+    num_rolls: int
+
     @staticmethod
-    def parse_result_line(line: str) -> PokemonResult:
+    def from_grid(
+        slot_machine: "SlotMachine", grid: Dict[str, Any]
+    ) -> List["SweepPoint"]:
+        # The grid spec looks like:
+        #
+        # {
+        #     "scales": {"legendary_probability": [1.0, 2.0], ...},
+        #     "autorelease": [false, true],
+        #     "num_rolls": [100, 500]
+        # }
+        #
+        # and its points are every combination of the listed values. "scales" and
+        # "autorelease" are optional, and default to the unscaled probabilities without
+        # autorelease.
+        if not isinstance(grid, dict):
+            raise ValueError("must be a JSON object")
+
+        unknown_keys = set(grid) - {"scales", "autorelease", "num_rolls"}
+        if len(unknown_keys) > 0:
+            raise ValueError(f"unknown keys: {', '.join(sorted(unknown_keys))}")
+
+        probabilities = slot_machine.to_dict()
+
+        scales: Dict[str, List[float]] = grid.get("scales", {})
+        if not isinstance(scales, dict):
+            raise ValueError("scales must be an object of probability names to lists")
+        for key, values in scales.items():
+            if key not in probabilities:
+                raise ValueError(f"unknown probability to scale: {key}")
+            if (
+                not isinstance(values, list)
+                or len(values) == 0
+                or any(not is_json_number(value) or value < 0.0 for value in values)
+            ):
+                raise ValueError(
+                    f"scales of {key} must be a non-empty list of non-negative numbers"
+                )
+
+        autorelease_values: List[bool] = grid.get("autorelease", [False])
         if (
-            line.endswith("\U0001f514")
-            or line.endswith(":wormholebell:")
-            or line.endswith(":shinySparkles:")
+            not isinstance(autorelease_values, list)
+            or len(autorelease_values) == 0
+            or any(not isinstance(value, bool) for value in autorelease_values)
         ):
-            pokemon_name = line.split(":")[1]
+            raise ValueError("autorelease must be a non-empty list of true or false")
 
-            return PokemonResult(pokemon_name, False)
-        elif line.startswith(":Giovanni:"):
-            return PokemonResult(None, True)
-        else:
-            return PokemonResult(None, False)
+        if "num_rolls" not in grid:
+            raise ValueError("missing num_rolls")
+        num_rolls_values: List[int] = grid["num_rolls"]
+        if (
+            not isinstance(num_rolls_values, list)
+            or len(num_rolls_values) == 0
+            or any(
+                not is_json_number(value) or not isinstance(value, int) or value < 1
+                for value in num_rolls_values
+            )
+        ):
+            raise ValueError("num_rolls must be a non-empty list of positive integers")
+
+        points = []
+        for point_scales in itertools.product(*scales.values()):
+            scaled = dict(probabilities)
+            for key, scale in zip(scales, point_scales):
+                scaled[key] = min(probabilities[key] * scale, 1.0)
+
+            for autorelease in autorelease_values:
+                for num_rolls in num_rolls_values:
+                    points.append(
+                        SweepPoint(
+                            dict(zip(scales, point_scales)),
+                            SlotMachine.from_json(scaled),
+                            autorelease,
+                            num_rolls,
+                        )
+                    )
 
-    @staticmethod
-    def parse_timestamp(timestamp_str: str) -> datetime.datetime:
-        # 2020-08-11T05:14:14.292+00:00
-        timestamp_format = "%Y-%m-%dT%H:%M:%S"
+        return points
 
-        return datetime.datetime.strptime(timestamp_str[:19], timestamp_format)
+    def cache_key(
+        self, catalog_hash: str, engine: str, num_cases: int, rng_seed: int
+    ) -> str:
+        # Hash of everything that the point's summary depends on
+        data = {
+            "version": SweepCache.FORMAT_VERSION,
+            "probabilities": self.slot_machine.to_dict(),
+            "catalog_hash": catalog_hash,
+            "num_rolls": self.num_rolls,
+            "autorelease": self.autorelease,
+            "rng_seed": rng_seed,
+            "num_cases": num_cases,
+            "engine": engine,
+        }
 
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
 
-def simulate(args: argparse.Namespace) -> None:
-    random.seed(args.rng_seed)
+    def to_row(self) -> Dict[str, Any]:
+        return {
+            **{f"{key}_scale": scale for key, scale in self.scales.items()},
+            **self.slot_machine.to_dict(),
+            "autorelease": self.autorelease,
+            "num_rolls": self.num_rolls,
+        }
 
-    with open(args.pokemon_csv) as input_stream:
-        pokemon = Pokemon.from_csv(input_stream)
 
-    with open(args.probabilities_json) as input_stream:
-        slot_machine = SlotMachine.from_json(json.load(input_stream))
+def is_json_number(value: Any) -> bool:
+    # JSON true and false are loaded as bools, which Python also counts as ints
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
 
-    print(len(pokemon))
-    print(slot_machine)
 
-    # Run the simulation
-    simulation_data = SimulationData()
+@dataclass
+class SweepCache:
+    # Stores the summary of each sweep point in an .npz file named after the hash of
+    # everything that the summary depends on, so entries never need to be invalidated
+    cache_dir: str
 
-    for case_id in range(0, args.num_cases):
-        case = simulation_data.new_case(case_id)
+    FORMAT_VERSION = 1
 
-        # Note: representing roll credits as 2*num_rolls to avoid floating point issues when
-        # accounting for autorelease, which has two released pokemon yield one roll.
+    @staticmethod
+    def open(cache_dir: str) -> "SweepCache":
+        os.makedirs(cache_dir, exist_ok=True)
 
-        collection = PokemonCollection()
-        roll_credits_times_2 = 0
-        for i in range(0, args.num_rolls):
-            roll_credits_times_2 += 2
+        return SweepCache(cache_dir)
 
-            while roll_credits_times_2 >= 2:
-                roll_credits_times_2 -= 2
+    def entry_filepath(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
 
-                results = slot_machine.roll(pokemon)
-                collection.extend(results)
+    def read(self, key: str) -> Optional["SimulationSummary"]:
+        entry_filepath = self.entry_filepath(key)
+        if not os.path.exists(entry_filepath):
+            return None
 
-                if args.autorelease:
-                    roll_credits_times_2 += collection.autorelease()
+        return SimulationSummary.read_npz(entry_filepath)
 
-            case.record(pokemon, collection, results, slot_machine)
+    def write(self, key: str, summary: "SimulationSummary") -> None:
+        with atomic_write(self.entry_filepath(key), "wb") as output_stream:
+            summary.write_npz(output_stream)
 
-        print(
-            f"{collection.num_unique()} / {len(pokemon)}, ({len(collection.pokemon)})"
+
+@dataclass
+class ComparisonSummary:
+    # Running statistics of the number of unique pokemon after each roll under two
+    # configurations, and of the difference between them within each case (B - A)
+    num_unique_a: RunningStats
+    num_unique_b: RunningStats
+    difference: RunningStats
+
+    @staticmethod
+    def empty(num_rolls: int) -> "ComparisonSummary":
+        return ComparisonSummary(
+            RunningStats.empty(num_rolls),
+            RunningStats.empty(num_rolls),
+            RunningStats.empty(num_rolls),
         )
 
-    # Output simulation results
-    data = simulation_data.to_data_frame()
+    def merge(self, other: "ComparisonSummary") -> None:
+        self.num_unique_a.merge(other.num_unique_a)
+        self.num_unique_b.merge(other.num_unique_b)
+        self.difference.merge(other.difference)
 
-    num_unique_pokemon_plot = (
-        plt9.ggplot(data, plt9.aes("roll_num", "num_unique_pokemon", color="case_id"))
-        + plt9.geom_line()
-        + plt9.geom_hline(yintercept=len(pokemon))
-        + plt9.ylim(0, len(pokemon))
-    )
+    def variance_reduction(self) -> "npt.NDArray[np.float64]":
+        import numpy as np
+
+        # How many times as many cases two independent runs would need to estimate the
+        # difference as precisely
+        independent_variance = (
+            self.num_unique_a.std() ** 2 + self.num_unique_b.std() ** 2
+        )
+        difference_variance = self.difference.std() ** 2
+
+        reduction: "npt.NDArray[np.float64]" = np.divide(
+            independent_variance,
+            difference_variance,
+            out=np.full(len(difference_variance), np.inf),
+            where=difference_variance > 0.0,
+        )
+
+        return reduction
 
-    num_unique_pokemon_plot.save(args.num_unique_pokemon_plot, dpi=300)
-    print("Output:", args.num_unique_pokemon_plot)
+    def print_summary(self, confidence: float) -> None:
+        if len(self.difference.mean) == 0:
+            return
 
-    data_2 = simulation_data.to_num_missing_data_frame()
+        half_width = self.difference.confidence_interval_widths(confidence)[-1] / 2.0
 
-    num_missing_pokemon_plot = (
-        plt9.ggplot(
-            data_2[data_2["case_id"] == 0],
-            plt9.aes("roll_num", "num_missing", fill="rarity"),
+        print(
+            f"Mean A {self.num_unique_a.mean[-1]}, mean B {self.num_unique_b.mean[-1]} after {len(self.difference.mean)} rolls over {self.difference.count} cases"
         )
-        + plt9.geom_area()
-        + plt9.geom_hline(yintercept=len(pokemon))
-        + plt9.ylim(0, len(pokemon))
-        + plt9.scale_fill_hue(
-            name="Rarity",
-            labels=[
-                "Common",
-                "Uncommon",
-                "Rare",
-                "Very rare",
-                "Legendary",
-                "Ultra beast",
-            ],
+        print(
+            f"Difference (B - A) {self.difference.mean[-1]} ± {half_width} ({confidence:.0%} confidence)"
+        )
+        print(
+            f"Independent runs would need {self.variance_reduction()[-1]:.1f}x as many cases for the same precision"
         )
-        + plt9.xlab("Num rolls (exculding extra rolls)")
-        + plt9.ylab("Num Pokémon missing")
-    )
 
-    num_missing_pokemon_plot.save(args.num_missing_pokemon_plot, dpi=300)
-    print("Output:", args.num_missing_pokemon_plot)
+    def to_data_frame(self, confidence: float) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        half_widths = self.difference.confidence_interval_widths(confidence) / 2.0
+
+        return pd.DataFrame(
+            {
+                "roll_num": np.arange(0, len(self.difference.mean)),
+                "mean_a": self.num_unique_a.mean,
+                "mean_b": self.num_unique_b.mean,
+                "difference": self.difference.mean,
+                "difference_std": self.difference.std(),
+                "difference_lower": self.difference.mean - half_widths,
+                "difference_upper": self.difference.mean + half_widths,
+                "variance_reduction": self.variance_reduction(),
+            }
+        )
 
-    data_3 = simulation_data.to_data_frame_chance_new()
+    def write_plot(self, filepath: str, confidence: float) -> None:
+        import plotnine as plt9
 
-    chance_new_pokemon_plot = (
-        plt9.ggplot(
-            data_3, plt9.aes("roll_num", "chance_new_in_rarity", color="rarity")
+        plot: "plt9.ggplot" = (
+            plt9.ggplot(
+                self.to_data_frame(confidence), plt9.aes("roll_num", "difference")
+            )
+            + plt9.geom_ribbon(
+                plt9.aes(ymin="difference_lower", ymax="difference_upper"), alpha=0.3
+            )
+            + plt9.geom_line()
+            + plt9.geom_hline(yintercept=0.0, linetype="dashed")
+            + plt9.xlab("Num rolls (exculding extra rolls)")
+            + plt9.ylab(f"Mean num_unique_pokemon B - A ({confidence:.0%} band)")
+        )
+        plot.save(
+            filepath,
+            width=PLOT_SIZE_INCHES[0],
+            height=PLOT_SIZE_INCHES[1],
+            units="in",
+            dpi=300,
+            verbose=False,
         )
-        + plt9.geom_line(size=1)
-        + plt9.ylim(0, 1.0)
-        + plt9.scale_color_hue(
-            name="Rarity",
-            labels=[
-                "Common",
-                "Uncommon",
-                "Rare",
-                "Very rare",
-                "Legendary",
-                "Ultra beast",
+
+
+@dataclass
+class ExactCollectionModel:
+    # Without autorelease, every roll is one independent draw from each slot row, so the
+    # number of pokemon missing from each rarity is a Markov chain that loses a missing
+    # pokemon with probability row_probability * num_missing / rarity_size on each roll.
+    # Stepping each chain's distribution forward gives the exact results, and since the
+    # rarities are independent the overall results follow from combining them.
+    pokemon: "Pokemon"
+    slot_machine: "SlotMachine"
+
+    # For each rarity, a (num_rolls x rarity_size + 1) array of the probability of each
+    # number of missing pokemon in that rarity after each roll
+    missing_distributions: List["npt.NDArray[np.float64]"]
+
+    @staticmethod
+    def calculate(
+        pokemon: "Pokemon", slot_machine: "SlotMachine", num_rolls: int
+    ) -> "ExactCollectionModel":
+        import numpy as np
+
+        missing_distributions = []
+        for (_, pokemon_in_rarity), slot_row_probability in zip(
+            pokemon.by_rarity(), slot_machine.probabilities()
+        ):
+            size = len(pokemon_in_rarity)
+            num_missing = np.arange(0, size + 1)
+            chance_new = slot_row_probability * num_missing / size
+
+            distribution = np.zeros(size + 1)
+            distribution[size] = 1.0
+
+            distributions = np.zeros((num_rolls, size + 1))
+            for roll_num in range(0, num_rolls):
+                got_new = distribution * chance_new
+                distribution = distribution - got_new
+                distribution[:-1] += got_new[1:]
+
+                distributions[roll_num] = distribution
+
+            missing_distributions.append(distributions)
+
+        return ExactCollectionModel(pokemon, slot_machine, missing_distributions)
+
+    def expected_num_missing(self) -> "npt.NDArray[np.float64]":
+        import numpy as np
+
+        # (num_rolls x rarity) array of the expected number of missing pokemon
+        return np.stack(
+            [
+                distributions @ np.arange(0, distributions.shape[1])
+                for distributions in self.missing_distributions
             ],
+            axis=1,
         )
-    )
 
-    chance_new_pokemon_plot.save(args.chance_new_pokemon_by_rarity_plot, dpi=300)
-    print("Output:", args.chance_new_pokemon_by_rarity_plot)
+    def expected_chance_new(self) -> "npt.NDArray[np.float64]":
+        import numpy as np
 
-    data_4 = simulation_data.to_data_frame_chance_any_new()
-    chance_any_new_pokemon_plot = (
-        plt9.ggplot(data_4, plt9.aes("roll_num", "chance_any_new"))
-        + plt9.geom_line()
-        + plt9.ylim(0, 1.0)
-    )
+        # The chance of a new pokemon is linear in the number missing, so its expected
+        # value comes straight from the expected number missing
+        sizes = np.array(self.pokemon.rarity_sizes)
 
-    chance_any_new_pokemon_plot.save(args.chance_any_new_pokemon_plot, dpi=300)
-    print("Output:", args.chance_any_new_pokemon_plot)
+        chance_new: "npt.NDArray[np.float64]" = (
+            self.expected_num_missing()
+            / sizes
+            * np.array(self.slot_machine.probabilities())
+        )
 
+        return chance_new
 
-def product(xs: Iterator[float]) -> float:
-    return functools.reduce(operator.mul, xs, 1)
+    def num_unique_distribution(self) -> "npt.NDArray[np.float64]":
+        import numpy as np
 
+        # (num_rolls x num_pokemon + 1) array of the probability of owning each number of
+        # unique pokemon after each roll, found by convolving the number owned of each
+        # rarity together (using FFTs to do all of the rolls at once)
+        fft_size = 1 << len(self.pokemon).bit_length()
 
-@dataclass
-class SimulationData:
-    cases: Dict[int, "SimulationCase"] = field(default_factory=dict)
+        num_unique_fft = None
+        for distributions in self.missing_distributions:
+            num_owned_fft = np.fft.rfft(distributions[:, ::-1], n=fft_size, axis=1)
+            num_unique_fft = (
+                num_owned_fft
+                if num_unique_fft is None
+                else num_unique_fft * num_owned_fft
+            )
 
-    def new_case(self, case_id: int) -> "SimulationCase":
-        assert case_id not in self.cases
+        assert num_unique_fft is not None
 
-        case = SimulationCase()
-        self.cases[case_id] = case
+        distribution = np.fft.irfft(num_unique_fft, n=fft_size, axis=1)
 
-        return case
+        return np.clip(distribution[:, : len(self.pokemon) + 1], 0.0, None)
 
-    def to_num_missing_data_frame(self) -> pd.DataFrame:
-        sim_results_lists = [
-            (case_id, roll_num, rarity, num_missing)
-            for case_id, simulation_case in self.cases.items()
-            for roll_num, entries in enumerate(simulation_case.num_missing_by_rarity)
-            for rarity, num_missing in entries.items()
-        ]
+    def print_summary(self) -> None:
+        if len(self.missing_distributions[0]) == 0:
+            return
 
-        data = pd.DataFrame(
-            sim_results_lists,
-            columns=["case_id", "roll_num", "rarity", "num_missing"],
+        expected_num_unique = len(self.pokemon) - self.expected_num_missing()[-1].sum()
+        percentiles = self.num_unique_percentiles([0.05, 0.5, 0.95])[-1]
+
+        print(
+            f"Expected {expected_num_unique} / {len(self.pokemon)}, (5%: {percentiles[0]}, 50%: {percentiles[1]}, 95%: {percentiles[2]})"
         )
 
-        data["rarity"] = pd.Categorical(
-            data["rarity"],
-            categories=[
-                "Common",
-                "Uncommon",
-                "Rare",
-                "Very rare",
-                "Legendary",
-                "Ultra beast",
+    def num_unique_percentiles(self, quantiles: List[float]) -> "npt.NDArray[np.int64]":
+        import numpy as np
+
+        cumulative = np.cumsum(self.num_unique_distribution(), axis=1)
+
+        return np.stack(
+            [
+                np.argmax(cumulative >= quantile - 1e-12, axis=1)
+                for quantile in quantiles
             ],
-            ordered=True,
+            axis=1,
         )
 
-        return data
+    def to_distribution_data_frame(self) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
 
-    def to_data_frame(self) -> pd.DataFrame:
-        sim_results_lists = [
-            zip(
-                [str(case_id)] * len(simulation_case.num_unique_pokemon),
-                range(0, len(simulation_case.num_unique_pokemon)),
-                simulation_case.num_unique_pokemon,
-            )
-            for case_id, simulation_case in self.cases.items()
-        ]
+        quantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+        percentiles = self.num_unique_percentiles(quantiles)
 
         data = pd.DataFrame(
-            [item for l in sim_results_lists for item in l],
-            columns=["case_id", "roll_num", "num_unique_pokemon"],
+            percentiles,
+            columns=[f"num_unique_pokemon_p{int(q * 100):02}" for q in quantiles],
         )
+        data.insert(0, "roll_num", np.arange(0, len(percentiles)))
+        data.insert(
+            1,
+            "expected_num_unique_pokemon",
+            len(self.pokemon) - self.expected_num_missing().sum(axis=1),
+        )
+
+        for rarity_name, distributions in zip(RARITIES, self.missing_distributions):
+            column_name = "chance_complete_" + rarity_name.lower().replace(" ", "_")
+            data[column_name] = distributions[:, 0]
 
         return data
 
-    def to_data_frame_chance_new(self) -> pd.DataFrame:
-        sim_results_lists = [
-            (case_id, roll_num, rarity, chance_new_in_rarity)
-            for case_id, simulation_case in self.cases.items()
-            for roll_num, entries in enumerate(
-                simulation_case.chance_get_new_pokemon_by_rarity
-            )
-            for rarity, chance_new_in_rarity in entries.items()
-        ]
+    # The same data frames as SimulationData, as a single case with the expected results
+    def to_data_frame(self) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
 
-        data = pd.DataFrame(
-            sim_results_lists,
-            columns=["case_id", "roll_num", "rarity", "chance_new_in_rarity"],
+        num_unique = len(self.pokemon) - self.expected_num_missing().sum(axis=1)
+
+        return pd.DataFrame(
+            {
+                "case_id": pd.Categorical(np.zeros(len(num_unique), dtype=np.int64)),
+                "roll_num": np.arange(0, len(num_unique)),
+                "num_unique_pokemon": num_unique,
+            }
         )
 
-        data["rarity"] = pd.Categorical(
-            data["rarity"],
-            categories=[
-                "Common",
-                "Uncommon",
-                "Rare",
-                "Very rare",
-                "Legendary",
-                "Ultra beast",
-            ],
-            ordered=True,
+    def to_num_missing_data_frame(self) -> "pd.DataFrame":
+        return self.to_rarity_data_frame(self.expected_num_missing(), "num_missing")
+
+    def to_data_frame_chance_new(self) -> "pd.DataFrame":
+        return self.to_rarity_data_frame(
+            self.expected_chance_new(), "chance_new_in_rarity"
         )
 
-        return data
+    def to_data_frame_chance_any_new(self) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
 
-    def to_data_frame_chance_any_new(self) -> pd.DataFrame:
-        sim_results_lists = [
-            (
-                case_id,
-                roll_num,
-                1.0
-                - product(
-                    (
-                        1.0 - chance_new_in_rarity
-                        for chance_new_in_rarity in entries.values()
-                    )
-                ),
-            )
-            for case_id, simulation_case in self.cases.items()
-            for roll_num, entries in enumerate(
-                simulation_case.chance_get_new_pokemon_by_rarity
-            )
-        ]
+        # The rarities are independent, so the chance of no new pokemon is the product of
+        # the expected chances of no new pokemon in each rarity
+        chance_any_new = 1.0 - np.prod(1.0 - self.expected_chance_new(), axis=1)
+
+        return pd.DataFrame(
+            {
+                "case_id": 0,
+                "roll_num": np.arange(0, len(chance_any_new)),
+                "chance_any_new": chance_any_new,
+            }
+        )
+
+    def to_rarity_data_frame(
+        self, values: "npt.NDArray[np.float64]", column_name: str
+    ) -> "pd.DataFrame":
+        import numpy as np
+        import pandas as pd
+
+        num_rolls = values.shape[0]
 
         data = pd.DataFrame(
-            sim_results_lists,
-            columns=["case_id", "roll_num", "chance_any_new"],
+            {
+                "case_id": 0,
+                "roll_num": np.repeat(np.arange(0, num_rolls), len(RARITIES)),
+                "rarity": np.tile(RARITIES, num_rolls),
+                column_name: values.reshape(-1),
+            }
+        )
+
+        data["rarity"] = pd.Categorical(
+            data["rarity"], categories=RARITIES, ordered=True
         )
 
         return data
@@ -663,24 +4822,17 @@ class SimulationData:
 
 @dataclass
 class SimulationCase:
-    num_unique_pokemon: List[int] = field(default_factory=list)
-    num_missing_by_rarity: List[Dict[str, int]] = field(default_factory=list)
-    chance_get_new_pokemon_by_rarity: List[Dict[str, float]] = field(
-        default_factory=list
-    )
+    # Views of one case's rows in the SimulationData arrays, which get filled in one roll
+    # at a time as the case is simulated
+    num_unique_pokemon: "npt.NDArray[np.integer[Any]]"
+    num_missing_by_rarity: "npt.NDArray[np.integer[Any]]"
+    num_recorded: int = 0
 
-    def record(
-        self,
-        pokemon: "Pokemon",
-        collection: "PokemonCollection",
-        results: List[str],
-        slot_machine: "SlotMachine",
-    ) -> None:
-        self.num_unique_pokemon.append(collection.num_unique())
-        self.num_missing_by_rarity.append(collection.num_missing_by_rarity(pokemon))
-        self.chance_get_new_pokemon_by_rarity.append(
-            collection.chance_get_new_pokemon_by_rarity(pokemon, slot_machine)
-        )
+    def record(self, collection: "PokemonCollection") -> None:
+        self.num_unique_pokemon[self.num_recorded] = collection.num_unique()
+        self.num_missing_by_rarity[self.num_recorded] = collection.num_missing()
+
+        self.num_recorded += 1
 
 
 @dataclass
@@ -692,6 +4844,29 @@ class Pokemon:
     legendary_pokemon: List[str]
     ultra_beast_pokemon: List[str]
 
+    # Each pokemon is also identified by a dense integer ID, with the IDs assigned in the
+    # same order as RARITIES so that each rarity occupies a contiguous range of IDs
+    # starting at its offset. names maps the IDs back to the pokemon names.
+    names: List[str] = field(init=False, repr=False, compare=False)
+    ids_by_name: Dict[str, int] = field(init=False, repr=False, compare=False)
+    rarity_offsets: List[int] = field(init=False, repr=False, compare=False)
+    rarity_sizes: List[int] = field(init=False, repr=False, compare=False)
+    rarity_indices: List[int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.names = []
+        self.rarity_offsets = []
+        self.rarity_sizes = []
+        self.rarity_indices = []
+        for rarity_index, (_, pokemon_in_rarity) in enumerate(self.by_rarity()):
+            self.rarity_offsets.append(len(self.names))
+            self.rarity_sizes.append(len(pokemon_in_rarity))
+
+            self.names.extend(pokemon_in_rarity)
+            self.rarity_indices.extend([rarity_index] * len(pokemon_in_rarity))
+
+        self.ids_by_name = {name: i for i, name in enumerate(self.names)}
+
     def __len__(self) -> int:
         return sum(
             (
@@ -707,6 +4882,25 @@ class Pokemon:
             )
         )
 
+    def catalog_hash(self) -> str:
+        # Identifies the pokemon and their rarities, in the order that their IDs are given
+        return hashlib.sha256(json.dumps(self.by_rarity()).encode()).hexdigest()
+
+    def by_rarity(self) -> List[Tuple[str, List[str]]]:
+        return list(
+            zip(
+                RARITIES,
+                [
+                    self.common_pokemon,
+                    self.uncommon_pokemon,
+                    self.rare_pokemon,
+                    self.very_rare_pokemon,
+                    self.legendary_pokemon,
+                    self.ultra_beast_pokemon,
+                ],
+            )
+        )
+
     @staticmethod
     def from_csv(input_stream: IO[str]) -> "Pokemon":
         common_pokemon: List[str] = []
@@ -752,8 +4946,21 @@ class SlotMachine:
     legendary_probability: float
     ultra_beast_probability: float
 
+    def probabilities(self) -> List[float]:
+        return [
+            self.common_probability,
+            self.uncommon_probability,
+            self.rare_probability,
+            self.very_rare_probability,
+            self.legendary_probability,
+            self.ultra_beast_probability,
+        ]
+
     def write_json(self, output_stream: IO[str]) -> None:
-        data = {
+        json.dump(self.to_dict(), output_stream, indent=4)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
             "common_probability": self.common_probability,
             "uncommon_probability": self.uncommon_probability,
             "rare_probability": self.rare_probability,
@@ -762,8 +4969,6 @@ class SlotMachine:
             "ultra_beast_probability": self.ultra_beast_probability,
         }
 
-        json.dump(data, output_stream, indent=4)
-
     @staticmethod
     def from_json(data: Dict[str, Any]) -> "SlotMachine":
         assert "common_probability" in data
@@ -782,112 +4987,135 @@ class SlotMachine:
             data["ultra_beast_probability"],
         )
 
-    def roll(self, pokemon: Pokemon) -> List[str]:
-        results: List[str] = []
+    def roll(self, pokemon: Pokemon, rng: Optional[random.Random] = None) -> List[str]:
+        return [pokemon.names[i] for i in self.roll_ids(pokemon, rng)]
 
-        data = [
-            (self.common_probability, pokemon.common_pokemon),
-            (self.uncommon_probability, pokemon.uncommon_pokemon),
-            (self.rare_probability, pokemon.rare_pokemon),
-            (self.very_rare_probability, pokemon.very_rare_pokemon),
-            (self.legendary_probability, pokemon.legendary_pokemon),
-            (self.ultra_beast_probability, pokemon.ultra_beast_pokemon),
-        ]
+    def roll_ids(
+        self, pokemon: Pokemon, rng: Optional[random.Random] = None
+    ) -> List[int]:
+        results: List[int] = []
+
+        uniform = random.random if rng is None else rng.random
+        # randrange(n) uses the random number stream in the same way as choice does on a
+        # sequence of length n, so rolling by ID gives the same pokemon as rolling by name
+        randrange = random.randrange if rng is None else rng.randrange
 
-        for probability, possible_pokemon in data:
-            r = random.random()
+        for probability, offset, size in zip(
+            self.probabilities(), pokemon.rarity_offsets, pokemon.rarity_sizes
+        ):
+            r = uniform()
 
             if r <= probability:
-                results.append(random.choice(possible_pokemon))
+                results.append(offset + randrange(size))
 
         return results
 
 
 @dataclass
 class PokemonCollection:
-    pokemon: Dict[str, int] = field(default_factory=dict)
+    # Number of each pokemon owned, indexed by pokemon ID. A plain list is used since
+    # indexing it from Python is faster than indexing an array.array or numpy array.
+    catalog: Pokemon
+    counts: List[int] = field(default_factory=list)
+
+    # Running counts kept up to date by extend and autorelease, so that neither they nor
+    # the per rarity lookups need to scan the whole catalog or collection. The per rarity
+    # counts are in the same order as RARITIES.
+    num_unique_pokemon: int = field(init=False)
+    num_owned_by_rarity: List[int] = field(init=False)
+    num_duplicates: int = field(init=False)
+    duplicated_ids: Set[int] = field(init=False)
+
+    def __post_init__(self) -> None:
+        if len(self.counts) == 0:
+            self.counts = [0] * len(self.catalog.names)
+
+        assert len(self.counts) == len(self.catalog.names)
+
+        self.num_unique_pokemon = 0
+        self.num_owned_by_rarity = [0] * len(RARITIES)
+        self.num_duplicates = 0
+        self.duplicated_ids = set()
+
+        for i, num in enumerate(self.counts):
+            if num > 0:
+                self.num_unique_pokemon += 1
+                self.num_owned_by_rarity[self.catalog.rarity_indices[i]] += 1
+
+            if num > 1:
+                self.num_duplicates += num - 1
+                self.duplicated_ids.add(i)
+
+    @staticmethod
+    def from_names(catalog: Pokemon, pokemon: Dict[str, int]) -> "PokemonCollection":
+        counts = [0] * len(catalog.names)
+        for name, num in pokemon.items():
+            counts[catalog.ids_by_name[name]] += num
+
+        return PokemonCollection(catalog, counts)
+
+    @property
+    def pokemon(self) -> Dict[str, int]:
+        # The number of each owned pokemon by name
+        return {
+            self.catalog.names[i]: num for i, num in enumerate(self.counts) if num > 0
+        }
 
     def extend(self, new_pokemon: List[str]) -> None:
+        self.extend_ids([self.catalog.ids_by_name[p] for p in new_pokemon])
+
+    def extend_ids(self, new_pokemon: List[int]) -> None:
+        counts = self.counts
         for p in new_pokemon:
-            if p in self.pokemon:
-                self.pokemon[p] += 1
+            if counts[p] > 0:
+                self.num_duplicates += 1
+                self.duplicated_ids.add(p)
             else:
-                self.pokemon[p] = 1
+                self.num_unique_pokemon += 1
+                self.num_owned_by_rarity[self.catalog.rarity_indices[p]] += 1
+
+            counts[p] += 1
 
     def num_unique(self) -> int:
-        return len(self.pokemon)
+        return self.num_unique_pokemon
 
-    def num_missing_by_rarity(self, pokemon: Pokemon) -> Dict[str, int]:
-        entries = [
-            ("Common", pokemon.common_pokemon),
-            ("Uncommon", pokemon.uncommon_pokemon),
-            ("Rare", pokemon.rare_pokemon),
-            ("Very rare", pokemon.very_rare_pokemon),
-            ("Legendary", pokemon.legendary_pokemon),
-            ("Ultra beast", pokemon.ultra_beast_pokemon),
+    def num_missing(self) -> List[int]:
+        return [
+            size - num_owned
+            for size, num_owned in zip(
+                self.catalog.rarity_sizes, self.num_owned_by_rarity
+            )
         ]
 
-        non_owned_pokemon_by_rarity: Dict[str, List[str]] = {}
-        for rarity_name, pokemon_in_rarity in entries:
-            non_owned_pokemon: List[str] = []
-            for p in pokemon_in_rarity:
-                if p not in self.pokemon:
-                    non_owned_pokemon.append(p)
-
-            non_owned_pokemon_by_rarity[rarity_name] = non_owned_pokemon
+    def num_missing_by_rarity(self, pokemon: Pokemon) -> Dict[str, int]:
+        assert pokemon is self.catalog
 
-        return {r: len(p) for r, p in non_owned_pokemon_by_rarity.items()}
+        return dict(zip(RARITIES, self.num_missing()))
 
     def chance_get_new_pokemon_by_rarity(
         self, pokemon: Pokemon, slot_machine: "SlotMachine"
     ) -> Dict[str, float]:
-        entries = [
-            ("Common", pokemon.common_pokemon, slot_machine.common_probability),
-            ("Uncommon", pokemon.uncommon_pokemon, slot_machine.uncommon_probability),
-            ("Rare", pokemon.rare_pokemon, slot_machine.rare_probability),
-            (
-                "Very rare",
-                pokemon.very_rare_pokemon,
-                slot_machine.very_rare_probability,
-            ),
-            (
-                "Legendary",
-                pokemon.legendary_pokemon,
-                slot_machine.legendary_probability,
-            ),
-            (
-                "Ultra beast",
-                pokemon.ultra_beast_pokemon,
-                slot_machine.ultra_beast_probability,
-            ),
-        ]
-
-        chance_new_pokemon_by_rarity: Dict[str, float] = {}
-        for rarity_name, pokemon_in_rarity, slot_row_probability in entries:
-            non_owned_pokemon: List[str] = []
-            for p in pokemon_in_rarity:
-                if p not in self.pokemon:
-                    non_owned_pokemon.append(p)
+        assert pokemon is self.catalog
 
-            chance_of_new_pokemon_in_rarity = len(non_owned_pokemon) / len(
-                pokemon_in_rarity
-            )
+        tables = chance_new_tables(
+            tuple(pokemon.rarity_sizes), tuple(slot_machine.probabilities())
+        )
 
-            chance_new_pokemon_by_rarity[rarity_name] = (
-                chance_of_new_pokemon_in_rarity * slot_row_probability
+        return {
+            rarity_name: table[num_missing]
+            for rarity_name, table, num_missing in zip(
+                RARITIES, tables.chance_new_lists, self.num_missing()
             )
-
-        return chance_new_pokemon_by_rarity
+        }
 
     def autorelease(self) -> int:
-        num_released = 0
-        for name, num in self.pokemon.items():
-            if num > 1:
-                while num > 1:
-                    num -= 1
-                    num_released += 1
+        num_released = self.num_duplicates
+
+        for i in self.duplicated_ids:
+            self.counts[i] = 1
 
-                self.pokemon[name] = 1
+        self.num_duplicates = 0
+        self.duplicated_ids.clear()
 
         return num_released
 